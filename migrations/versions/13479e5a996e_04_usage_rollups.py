@@ -0,0 +1,37 @@
+"""04_usage-rollups
+
+Revision ID: 13479e5a996e
+Revises: b849885e888e
+Create Date: 2026-10-18 11:47:52.860413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '13479e5a996e'
+down_revision: Union[str, None] = 'b849885e888e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_rollups',
+                    sa.Column('url_id', sa.INTEGER(), nullable=False),
+                    sa.Column('granularity', sa.String(length=6), nullable=False),
+                    sa.Column('bucket', sa.DateTime(), nullable=False),
+                    sa.Column('clicks', sa.BigInteger(), nullable=False),
+                    sa.ForeignKeyConstraint(['url_id'], ['short_urls.id'], ),
+                    sa.PrimaryKeyConstraint('url_id', 'granularity', 'bucket')
+    )
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute("INSERT INTO usage_rollups (url_id, granularity, bucket, clicks) "
+                   f"SELECT url_id, '{granularity}', date_trunc('{granularity}', usage_datetime), "
+                   "count(*) FROM usages WHERE usage_datetime IS NOT NULL GROUP BY 1, 3")
+
+
+def downgrade() -> None:
+    op.drop_table('usage_rollups')
@@ -0,0 +1,36 @@
+"""09_app-metadata
+
+Revision ID: 3e8b61d0f4a9
+Revises: a7e3f90c2d14
+Create Date: 2026-10-18 21:02:17.482913
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8b61d0f4a9'
+down_revision: Union[str, None] = 'a7e3f90c2d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# fingerprints have been computed by the previous migration as configured by CANONICALIZE_URLS
+CANONICALIZE_URLS = os.environ.get('CANONICALIZE_URLS', '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def upgrade() -> None:
+    app_metadata = op.create_table('app_metadata',
+                                   sa.Column('key', sa.String(), nullable=False),
+                                   sa.Column('value', sa.String(), nullable=False),
+                                   sa.PrimaryKeyConstraint('key')
+    )
+    op.bulk_insert(app_metadata, [{'key': 'url_fingerprint_mode',
+                                   'value': 'canonical' if CANONICALIZE_URLS else 'exact'}])
+
+
+def downgrade() -> None:
+    op.drop_table('app_metadata')
@@ -0,0 +1,90 @@
+"""06_partitioned-usages
+
+Revision ID: 49ee9819fbaa
+Revises: fb2281409b35
+Create Date: 2026-10-18 13:02:41.518203
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49ee9819fbaa'
+down_revision: Union[str, None] = 'fb2281409b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# monthly partitions are created up to this number of months after the current one
+MONTHS_AHEAD = 3
+COLUMNS = 'id, url_id, usage_datetime, client_host, client_port'
+
+
+def create_usages(primary_key: sa.PrimaryKeyConstraint, nullable: bool, **kwargs) -> None:
+    """Creates the usages table and its indexes, keeping the existing identifier sequence"""
+    op.create_table('usages',
+                    sa.Column('id', sa.INTEGER(), nullable=False,
+                              server_default=sa.text("nextval('usages_id_seq'::regclass)")),
+                    sa.Column('url_id', sa.INTEGER(), nullable=False),
+                    sa.Column('usage_datetime', sa.DateTime(), nullable=nullable),
+                    sa.Column('client_host', sa.String(), nullable=False),
+                    sa.Column('client_port', sa.Integer(), nullable=False),
+                    sa.ForeignKeyConstraint(['url_id'], ['short_urls.id'], ),
+                    primary_key,
+                    **kwargs
+    )
+    op.create_index('ix_usages_usage_datetime', 'usages', ['usage_datetime'], unique=False)
+    op.create_index('ix_usages_url_id_usage_datetime_id', 'usages',
+                    ['url_id', 'usage_datetime', 'id'], unique=False)
+
+
+def rename_usages(new_name: str) -> None:
+    """Renames the usages table out of the way together with its constraints and indexes"""
+    op.rename_table('usages', new_name)
+    op.drop_constraint('usages_url_id_fkey', new_name, type_='foreignkey')
+    op.execute(f'ALTER TABLE {new_name} RENAME CONSTRAINT usages_pkey TO {new_name}_pkey')
+    op.drop_index('ix_usages_usage_datetime', table_name=new_name)
+    op.drop_index('ix_usages_url_id_usage_datetime_id', table_name=new_name)
+
+
+def upgrade() -> None:
+    rename_usages('usages_legacy')
+    create_usages(sa.PrimaryKeyConstraint('id', 'usage_datetime'), nullable=False,
+                  postgresql_partition_by='RANGE (usage_datetime)')
+    op.execute('CREATE TABLE usages_default PARTITION OF usages DEFAULT')
+    # monthly partitions cover the existing usages, further ones are created by
+    # `python maintenance.py manage-partitions`
+    now = datetime.utcnow()
+    first = op.get_bind().execute(sa.text('SELECT min(usage_datetime) FROM usages_legacy')).scalar()
+    start = min(first or now, now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range((now.year - start.year) * 12 + now.month - start.month + MONTHS_AHEAD + 1):
+        end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        op.execute(f"CREATE TABLE usages_p{start:%Y%m%d} PARTITION OF usages "
+                   f"FOR VALUES FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')")
+        start = end
+    op.execute(f"INSERT INTO usages ({COLUMNS}) SELECT id, url_id, "
+               "COALESCE(usage_datetime, timezone('utc', now())), client_host, client_port "
+               "FROM usages_legacy")
+    # usages without a date were left out of the rollups, they are added with the date given
+    # to them above, so that the rollups count every usage
+    for granularity in ('minute', 'hour', 'day'):
+        op.execute("INSERT INTO usage_rollups (url_id, granularity, bucket, clicks) "
+                   f"SELECT url_id, '{granularity}', "
+                   f"date_trunc('{granularity}', timezone('utc', now())), count(*) "
+                   "FROM usages_legacy WHERE usage_datetime IS NULL GROUP BY url_id "
+                   "ON CONFLICT (url_id, granularity, bucket) "
+                   "DO UPDATE SET clicks = usage_rollups.clicks + excluded.clicks")
+    op.execute('ALTER SEQUENCE usages_id_seq OWNED BY usages.id')
+    op.drop_table('usages_legacy')
+
+
+def downgrade() -> None:
+    rename_usages('usages_partitioned')
+    create_usages(sa.PrimaryKeyConstraint('id'), nullable=True)
+    op.execute(f'INSERT INTO usages ({COLUMNS}) SELECT {COLUMNS} FROM usages_partitioned')
+    op.execute('ALTER SEQUENCE usages_id_seq OWNED BY usages.id')
+    # partitions are dropped together with the table
+    op.drop_table('usages_partitioned')
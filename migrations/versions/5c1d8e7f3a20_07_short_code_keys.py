@@ -0,0 +1,76 @@
+"""07_short-code-keys
+
+Revision ID: 5c1d8e7f3a20
+Revises: 49ee9819fbaa
+Create Date: 2026-10-18 13:41:09.274816
+
+"""
+import os
+import string
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d8e7f3a20'
+down_revision: Union[str, None] = '49ee9819fbaa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# number of short URLs backfilled at once
+BATCH_SIZE = 10000
+# settings of the local providers as read by the application, with the same defaults
+SHORT_URL_PREFIX = os.environ.get('SHORT_URL_BASE', 'http://localhost:8000').rstrip('/') + '/'
+SHORT_CODE_ALPHABET = os.environ.get('SHORT_CODE_ALPHABET', string.digits + string.ascii_letters)
+SHORT_CODE_LENGTH = int(os.environ.get('SHORT_CODE_LENGTH', '7'))
+MAX_CODE_KEY = 2 ** 63 - 1
+
+
+def short_url_code_key(short_url: str) -> Optional[int]:
+    """Returns the number encoded by the short code of a short URL served by the application
+    or None if it has another prefix, length or alphabet or does not fit into a BIGINT column.
+    It is the decoding of the local providers at the time of the migration, which does not
+    depend on the application code.
+    """
+    code = short_url[len(SHORT_URL_PREFIX):]
+    if not short_url.startswith(SHORT_URL_PREFIX) or len(code) != SHORT_CODE_LENGTH:
+        return None
+    number = 0
+    for char in code:
+        digit = SHORT_CODE_ALPHABET.find(char)
+        if digit < 0:
+            return None
+        number = number * len(SHORT_CODE_ALPHABET) + digit
+    return number if number <= MAX_CODE_KEY else None
+
+
+def upgrade() -> None:
+    # URLs were created as UUID columns, which do not match the text type of the model
+    for column in ('initial_url', 'short_url'):
+        op.alter_column('short_urls', column, type_=sa.UnicodeText(),
+                        existing_type=sa.UUID(), postgresql_using=f'{column}::text')
+    op.add_column('short_urls', sa.Column('code_key', sa.BigInteger(), nullable=True))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, short_url FROM short_urls WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        keys = [{'row_id': row_id, 'code_key': short_url_code_key(short_url)}
+                for row_id, short_url in rows]
+        keys = [key for key in keys if key['code_key'] is not None]
+        if keys:
+            bind.execute(sa.text('UPDATE short_urls SET code_key = :code_key WHERE id = :row_id'),
+                         keys)
+        last_id = rows[-1][0]
+    op.create_unique_constraint('short_urls_code_key_key', 'short_urls', ['code_key'])
+
+
+def downgrade() -> None:
+    # URLs stay text, as they cannot be converted back to UUID
+    op.drop_constraint('short_urls_code_key_key', 'short_urls', type_='unique')
+    op.drop_column('short_urls', 'code_key')
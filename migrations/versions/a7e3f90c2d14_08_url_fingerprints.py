@@ -0,0 +1,84 @@
+"""08_url-fingerprints
+
+Revision ID: a7e3f90c2d14
+Revises: 5c1d8e7f3a20
+Create Date: 2026-10-18 14:16:52.603117
+
+"""
+import hashlib
+import os
+from typing import Sequence, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3f90c2d14'
+down_revision: Union[str, None] = '5c1d8e7f3a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# number of short URLs backfilled at once
+BATCH_SIZE = 10000
+CANONICALIZE_URLS = os.environ.get('CANONICALIZE_URLS', '').lower() in ('1', 'true', 'yes', 'on')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """Returns canonical form of the URL as the application built it at the time of the
+    migration, which does not depend on the application code
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    if parts.hostname:
+        host = f'[{parts.hostname}]' if ':' in parts.hostname else parts.hostname
+        userinfo = parts.netloc.rpartition('@')[0]
+        netloc = f'{userinfo}@{host}' if userinfo else host
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            netloc = f'{netloc}:{port}'
+    path = parts.path or ('/' if netloc else '')
+    query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    return urlunsplit((scheme, netloc, path, query, parts.fragment))
+
+
+def url_fingerprint(url: str) -> bytes:
+    """Returns 128-bit fingerprint of the original URL normalized as configured"""
+    normalized = canonicalize_url(url) if CANONICALIZE_URLS else url
+    return hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+
+
+def upgrade() -> None:
+    op.add_column('short_urls', sa.Column('url_fingerprint', sa.LargeBinary(length=16),
+                                          nullable=True))
+    # fingerprints depend on CANONICALIZE_URLS, duplicates under canonicalization make the
+    # unique constraint fail and have to be merged first
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            'SELECT id, initial_url FROM short_urls WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text('UPDATE short_urls SET url_fingerprint = :fingerprint '
+                             'WHERE id = :row_id'),
+                     [{'row_id': row_id, 'fingerprint': url_fingerprint(initial_url)}
+                      for row_id, initial_url in rows])
+        last_id = rows[-1][0]
+    op.alter_column('short_urls', 'url_fingerprint', nullable=False)
+    op.create_unique_constraint('short_urls_url_fingerprint_key', 'short_urls',
+                                ['url_fingerprint'])
+    op.drop_constraint('short_urls_initial_url_key', 'short_urls', type_='unique')
+
+
+def downgrade() -> None:
+    op.create_unique_constraint('short_urls_initial_url_key', 'short_urls', ['initial_url'])
+    op.drop_constraint('short_urls_url_fingerprint_key', 'short_urls', type_='unique')
+    op.drop_column('short_urls', 'url_fingerprint')
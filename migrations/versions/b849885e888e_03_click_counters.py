@@ -0,0 +1,30 @@
+"""03_click-counters
+
+Revision ID: b849885e888e
+Revises: be1a0720e6cb
+Create Date: 2026-10-18 11:02:17.514029
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b849885e888e'
+down_revision: Union[str, None] = 'be1a0720e6cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('short_urls', sa.Column('click_count', sa.BigInteger(), nullable=False,
+                                          server_default='0'))
+    op.execute('UPDATE short_urls SET click_count = counts.clicks '
+               'FROM (SELECT url_id, count(*) AS clicks FROM usages GROUP BY url_id) AS counts '
+               'WHERE short_urls.id = counts.url_id')
+
+
+def downgrade() -> None:
+    op.drop_column('short_urls', 'click_count')
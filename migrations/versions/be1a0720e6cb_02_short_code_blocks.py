@@ -0,0 +1,26 @@
+"""02_short-code-blocks
+
+Revision ID: be1a0720e6cb
+Revises: 6f404cfbb52b
+Create Date: 2026-10-18 10:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'be1a0720e6cb'
+down_revision: Union[str, None] = '6f404cfbb52b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_blocks')))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_blocks')))
@@ -0,0 +1,26 @@
+"""05_usages-keyset-index
+
+Revision ID: fb2281409b35
+Revises: 13479e5a996e
+Create Date: 2026-10-18 12:20:05.137462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fb2281409b35'
+down_revision: Union[str, None] = '13479e5a996e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_usages_url_id_usage_datetime_id', 'usages',
+                    ['url_id', 'usage_datetime', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_usages_url_id_usage_datetime_id', table_name='usages')
@@ -29,10 +29,9 @@ async def ping_database(database: AsyncSession = Depends(get_session)) -> Dict[s
         Dict[str, float]: contains ping time in seconds.
     """
     try:
-        start_time = time.time()
+        start_time = time.perf_counter()
         await database.execute(text('SELECT 1'))
-        end_time = time.time()
-        return {'ping_time': f'{round((end_time - start_time), 2)}'}
+        return {'ping_time': time.perf_counter() - start_time}
     except OSError as exc:
         logger.error(exc)
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
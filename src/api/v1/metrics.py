@@ -0,0 +1,18 @@
+"""Contains the endpoint exposing metrics of the application"""
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from core.metrics import CONTENT_TYPE, registry, render
+
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=Response)
+async def get_metrics() -> Response:
+    """Returns metrics of all workers in the Prometheus text format.
+
+    Returns:
+        Response: metrics in the Prometheus text format.
+    """
+    return Response(render(await registry.collect()), media_type=CONTENT_TYPE)
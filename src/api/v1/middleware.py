@@ -1,24 +1,104 @@
 """Contains application middleware"""
+import math
+import time
+
 from fastapi import Request, status
 from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from core.config import app_settings
+from core.ip_filter import IPFilter, black_list
 from core.logger import get_logger
+from core.metrics import request_duration, requests_in_progress
+from services.rate_limiter import rate_limiter
 
 
 logger = get_logger(__name__)
 
 
-async def check_allowed_ip(request: Request) -> None:
-    """Checks if client address is in the black list.
+class BlackListMiddleware:
+    """Pure ASGI middleware rejecting clients from the black list before the request reaches
+    routing, dependencies and database sessions. Blocked HTTP requests get the same 403
+    response as HTTPException(403) produces, blocked WebSocket connections are closed.
+    """
+    def __init__(self, app: ASGIApp, ip_filter: IPFilter = black_list):
+        self._app = app
+        self._ip_filter = ip_filter
+        self._forbidden = JSONResponse({'detail': 'Forbidden'},
+                                       status_code=status.HTTP_403_FORBIDDEN)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        client = scope.get('client')
+        if scope['type'] in ('http', 'websocket') and client and client[0] in self._ip_filter:
+            logger.debug("Attempt of accessing application from banned host: %s", client[0])
+            if scope['type'] == 'http':
+                await self._forbidden(scope, receive, send)
+            else:
+                await send({'type': 'websocket.close', 'code': 1008})
+            return
+        await self._app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware measuring the time of handling HTTP requests labeled by the method,
+    the path template of the matched route, which keeps the number of labels bounded, and the
+    status code of the response. Requests which fail before the response is started are counted
+    as 500 responses.
+    """
+    def __init__(self, app: ASGIApp):
+        self._app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        method = (scope['method'],)
+        requests_in_progress.inc(method)
+        started = time.perf_counter()
+        try:
+            await self._app(scope, receive, send_with_status)
+        finally:
+            requests_in_progress.dec(method)
+            route = scope.get('route')
+            request_duration.observe(time.perf_counter() - started,
+                                     (scope['method'], route.path if route else '',
+                                      str(status_code)))
 
-    Args:
-        request (Request): incoming request.
 
-    Raises:
-        HTTPException: if client host is in the black list.
+class RateLimited:
+    """Route dependency limiting the rate of requests of every client to a group of routes
+    according to `rate_limits` in the settings. Route dependencies are resolved before the
+    parameters of the endpoint, so throttled requests do not open database sessions.
     """
-    client_host = request.client.host
-    if client_host in app_settings.black_list:
-        logger.debug("Attempt of accessing application from banned host: %s", client_host)
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    def __init__(self, group: str):
+        self._group = group
+
+    async def __call__(self, request: Request) -> None:
+        """Counts the request of the client.
+
+        Args:
+            request (Request): incoming request.
+
+        Raises:
+            HTTPException (429): if the client has exceeded the limit.
+        """
+        limit = app_settings.rate_limits.get(self._group)
+        if limit is None:
+            return
+        client_host = request.client.host
+        retry_after = await rate_limiter.acquire(f'{self._group}:{client_host}', rate=limit.rate,
+                                                 burst=limit.burst)
+        if retry_after > 0:
+            logger.debug("Throttling %s requests of host: %s", self._group, client_host)
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                detail="Too many requests",
+                                headers={'Retry-After': str(math.ceil(retry_after))})
@@ -1,19 +1,71 @@
 """Contains paginator"""
-from typing import Dict
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
-from fastapi import Query
+from fastapi import HTTPException, Query, status
+import orjson
+
+
+def encode_cursor(usage_datetime: datetime, usage_id: int) -> str:
+    """Returns an opaque cursor pointing at a usage.
+
+    Args:
+        usage_datetime (datetime): date and time of the usage;
+        usage_id (int): unique identifier of the usage.
+
+    Returns:
+        str: URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps([usage_datetime, usage_id])).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Returns date, time and identifier of the usage the cursor points at.
+
+    Args:
+        cursor (str): cursor returned by `encode_cursor`.
+
+    Raises:
+        ValueError: if the cursor is malformed.
+
+    Returns:
+        Tuple[datetime, int]: date and time of the usage and its unique identifier.
+    """
+    try:
+        usage_datetime, usage_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(usage_datetime), int(usage_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as exc:
+        raise ValueError(f'Malformed cursor: {cursor}') from exc
 
 
 def get_pagination_parameters(
     max_result: int = Query(default=10, ge=1, alias='max-result'),
-    offset: int = Query(default=0, ge=0, alias='offset')) -> Dict[str, int]:
+    offset: int = Query(default=0, ge=0, alias='offset'),
+    cursor: Optional[str] = Query(default=None, alias='cursor')) -> Dict[str, Any]:
     """Returns pagination parameters.
 
     Args:
         max_result (int, optional): number of rows returned by a query. Defaults to 10.
         offset (int, optional): skips the query by the specified number of rows. Defaults to 0.
+        cursor (Optional[str], optional): switches to cursor pagination, rows following the one
+            the cursor points at are returned, an empty cursor starts from the first row.
+            Defaults to None.
+
+    Raises:
+        HTTPException (400): if the cursor is malformed.
 
     Returns:
-        Dict[str, int]: pagination parameters.
+        Dict[str, Any]: pagination parameters, the cursor is decoded to date, time and
+            identifier of the row or is an empty tuple for the first page.
     """
-    return {"max_result": max_result, "offset": offset}
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Malformed cursor") from exc
+    elif cursor is not None:
+        cursor = ()
+    return {"max_result": max_result, "offset": offset, "cursor": cursor}
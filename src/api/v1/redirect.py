@@ -0,0 +1,130 @@
+"""Contains the endpoint redirecting short URLs to the original ones"""
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.v1.middleware import RateLimited
+from core.config import app_settings
+from core.metrics import cache_lookups
+from db.db import get_read_session, get_session, release
+from schemas.usage_schemas import UsageCreate
+from services.cache import MISSING, LRUCache
+from services.short_code_services import build_short_url
+from services.short_url_services import invalidation_listener, short_url_crud
+from services.usage_recorder import usage_recorder
+from services.usage_services import usage_crud
+
+
+router = APIRouter()
+
+# identifier, whether the short URL is active and rendered redirect headers keyed by short URLs
+redirect_cache: LRUCache[str, Tuple[int, bool, List[Tuple[bytes, bytes]]]] = LRUCache(
+    max_size=app_settings.cache_max_size, ttl=app_settings.cache_ttl,
+    negative_ttl=app_settings.cache_negative_ttl)
+cache_lookups.set_function(lambda: redirect_cache.hits, ('redirect', 'hit'))
+cache_lookups.set_function(lambda: redirect_cache.misses, ('redirect', 'miss'))
+
+
+class RedirectTemplate(Response):
+    """Temporary redirect sent with headers rendered once per short URL, so a cached redirect
+    does not encode anything.
+    """
+    def __init__(self, raw_headers: List[Tuple[bytes, bytes]]):
+        # Response.__init__ is skipped, as it renders the headers
+        self.status_code = status.HTTP_307_TEMPORARY_REDIRECT
+        self.background = None
+        self.body = b''
+        self.raw_headers = raw_headers
+
+
+def render_headers(initial_url: str) -> List[Tuple[bytes, bytes]]:
+    """Returns headers of the redirect to the original URL.
+
+    Args:
+        initial_url (str): original URL.
+
+    Returns:
+        List[Tuple[bytes, bytes]]: raw headers.
+    """
+    # the same characters are kept unquoted as by starlette.responses.RedirectResponse
+    location = quote(initial_url, safe=":/%#?=@[]!$&'()*+,;")
+    return [(b'location', location.encode('latin-1')),
+            (b'cache-control', f'private, max-age={app_settings.redirect_max_age}'.encode()),
+            (b'content-length', b'0')]
+
+
+async def invalidate_redirect(payload: Dict[str, Any]) -> None:
+    """Removes a short URL deleted by any worker from the redirect cache of the current one.
+
+    Args:
+        payload (Dict[str, Any]): identifier, short URL and original URL of the deleted row.
+    """
+    redirect_cache.invalidate(payload['short_url'])
+
+
+async def reset_redirects() -> None:
+    """Clears the redirect cache after invalidations might have been missed"""
+    redirect_cache.clear()
+
+
+invalidation_listener.subscribe(invalidate_redirect)
+invalidation_listener.subscribe_reset(reset_redirects)
+
+
+@router.get('/{code}', response_class=RedirectTemplate,
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            dependencies=[Depends(RateLimited('redirect'))])
+async def redirect(*, db: AsyncSession = Depends(get_read_session),
+                   primary: AsyncSession = Depends(get_session), code: str,
+                   request: Request) -> Response:
+    """Redirects the short URL to the original one. Redirects are cached in-process together
+    with their headers, so a cached redirect only records the usage and does not use the
+    connection pool.
+
+    Args:
+        db (AsyncSession, optional): read-only database session.
+            Defaults to Depends(get_read_session);
+        primary (AsyncSession, optional): database session. Defaults to Depends(get_session);
+        code (str): short code;
+        request (Request): client request.
+
+    Raises:
+        HTTPException (404): if the short URL does not exist;
+        HTTPException (410): if the short URL has been marked as deleted.
+
+    Returns:
+        Response: temporary redirect to the original URL.
+    """
+    short_url = build_short_url(code)
+    entry: Optional[Tuple[int, bool, List[Tuple[bytes, bytes]]]] = redirect_cache.get(short_url)
+    if entry is MISSING:
+        replica = db.bind is not primary.bind
+        # rows read from a replica might have been deleted on the primary, so they are cached
+        # only for the replication lag
+        short_url_db = await short_url_crud.read_by_code(database=db, code=code,
+                                                         fill_cache=not replica)
+        ttl = app_settings.database_replica_max_lag if replica else None
+        if short_url_db is None and replica:
+            # the short URL might have been created before the replica caught up
+            short_url_db = await short_url_crud.read_by_code(database=primary, code=code)
+            ttl = None
+        # connections are not held while the usage is queued
+        await release(db, primary)
+        entry = None if short_url_db is None else (
+            short_url_db.id, short_url_db.active is not False,
+            render_headers(short_url_db.initial_url))
+        redirect_cache.set(short_url, entry, ttl=ttl)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    url_id, active, raw_headers = entry
+    if not active:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Item deleted")
+    usage = UsageCreate(url_id=url_id, client_host=request.client.host,
+                        client_port=request.client.port)
+    if not await usage_recorder.record(usage):
+        await usage_crud.create_many(database=primary, rows=[usage.model_dump()])
+    return RedirectTemplate(raw_headers)
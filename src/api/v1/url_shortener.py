@@ -1,42 +1,73 @@
 """Contains API endpoints"""
-from typing import Any, Dict, List, Union
+import csv
+from datetime import datetime, timedelta, timezone
+import io
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Union
 
 from fastapi import APIRouter, Depends, Request, status, Query
-from fastapi.exceptions import HTTPException
-from pyshorteners import Shortener
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.exceptions import HTTPException, RequestValidationError
+from fastapi.responses import StreamingResponse
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
-from api.v1.paginator import get_pagination_parameters
+from api.v1.middleware import RateLimited
+from api.v1.paginator import encode_cursor, get_pagination_parameters
+from api.v1.redirect import redirect_cache
+from core.config import app_settings
 from core.logger import get_logger
-from db.db import get_session
+from db.db import get_read_session, get_session, release
 from models.models import ShortURLs
 from schemas import short_url_schemas, usage_schemas
-from services.short_url_services import short_url_crud
-from services.usage_services import usage_crud
+from services.cache import MISSING
+from services.short_code_services import build_short_url, short_url_provider
+from services.short_url_services import (ShortURLGenerationError, short_url_cache,
+                                         short_url_crud)
+from services.usage_recorder import usage_recorder
+from services.usage_services import GRANULARITIES, usage_crud
 
 
 logger = get_logger(__name__)
 router = APIRouter()
-shortener = Shortener()
 
 
-async def get_url(url_id: int, database: AsyncSession = Depends(get_session)) -> ShortURLs:
-    """Checks if URL exists in the database.
+async def get_url(url_id: int, database: AsyncSession = Depends(get_read_session),
+                  primary: AsyncSession = Depends(get_session)) -> ShortURLs:
+    """Checks if URL exists in the database. Rows and missing identifiers are cached in-process,
+    deleted rows are cached as well and have to be checked by the caller. The row is read from
+    a replica, identifiers missing there are checked on the primary, as they might have been
+    created before the replica caught up. Rows read from a replica are cached only for the
+    replication lag, as they might have been deleted on the primary. Connections of the
+    sessions are released after the lookup, so they are not held while the rest of the request
+    is handled.
 
     Args:
         url_id (int): unique identifier of the requested URL;
-        db (AsyncSession, optional): database session. Defaults to Depends(get_session).
+        database (AsyncSession, optional): read-only database session.
+            Defaults to Depends(get_read_session);
+        primary (AsyncSession, optional): database session. Defaults to Depends(get_session).
 
     Returns:
         short_url_db (ShortURLs): database view for the requested url_id.
     """
-    short_url_db = await short_url_crud.read(database=database, entity_id=url_id)
+    short_url_db = short_url_cache.get(url_id)
+    if short_url_db is MISSING:
+        replica = database.bind is not primary.bind
+        short_url_db = await short_url_crud.read(database=database, entity_id=url_id,
+                                                 fill_cache=not replica)
+        ttl = app_settings.database_replica_max_lag if replica else None
+        if short_url_db is None and replica:
+            short_url_db = await short_url_crud.read(database=primary, entity_id=url_id)
+            ttl = None
+        await release(database, primary)
+        short_url_cache.set(url_id, short_url_db, ttl=ttl)
     if not short_url_db:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     return short_url_db
 
 
-@router.post('/', response_model=short_url_schemas.ShortURL, status_code=status.HTTP_201_CREATED)
+@router.post('/', response_model=short_url_schemas.ShortURL, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(RateLimited('create'))])
 async def create_short_url(*, db: AsyncSession = Depends(get_session),
                            entity_in: short_url_schemas.ShortURLBase) -> Any:
     """Creates short URL for the given original URL.
@@ -47,22 +78,28 @@ async def create_short_url(*, db: AsyncSession = Depends(get_session),
 
     Raises:
         HTTPException (410): if the requested URL is already in the database, but marked
-            as deleted.
+            as deleted;
+        HTTPException (503): if a unique short URL could not be generated.
 
     Returns:
         short_url_schemas.ShortURL: unique identifier of the original URL, original URL itself
             and shortened URL for it.
     """
-    short_url_db = await short_url_crud.read_by_initial_url(database=db,
-                                                            initial_url=entity_in.initial_url)
-    if not short_url_db:
-        short_url_db = await short_url_crud.create(
-            database=db,
-            obj_in=short_url_schemas.ShortURLCreate(
-                initial_url=entity_in.initial_url,
-                short_url=shortener.tinyurl.short(entity_in.initial_url)))
+    try:
+        short_url_db, created = await short_url_crud.upsert(
+            database=db, initial_url=entity_in.initial_url, provider=short_url_provider,
+            max_attempts=app_settings.short_code_max_attempts)
+    except ShortURLGenerationError as exc:
+        logger.error(exc)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Short URL could not be generated") from exc
+    if created:
+        # the identifier and the short URL might have been cached as missing before the row
+        # was created
+        short_url_cache.invalidate(short_url_db.id)
+        redirect_cache.invalidate(short_url_db.short_url)
         logger.info("Add new shortened URL %s for the original %s", short_url_db.short_url,
-                    short_url_db.initial_url)
+                    short_url_db.initial_url, extra={'sampled': True})
     if short_url_db.active is False:
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Item deleted")
     return short_url_schemas.ShortURL(id=short_url_db.id,
@@ -70,11 +107,192 @@ async def create_short_url(*, db: AsyncSession = Depends(get_session),
                                       short_url=short_url_db.short_url)
 
 
+BULK_ADAPTER = TypeAdapter(List[short_url_schemas.ShortURLBase])
+BULK_ITEMS_SCHEMA = {'type': 'array', 'items': {'$ref': '#/components/schemas/ShortURLBase'}}
+
+
+async def read_body(request: Request, max_size: int) -> bytes:
+    """Reads the body of the request, which is rejected by its Content-Length or as soon as
+    more than `max_size` bytes have been received.
+
+    Args:
+        request (Request): client request;
+        max_size (int): maximum size of the body in bytes.
+
+    Raises:
+        HTTPException (413): if the body is too large.
+
+    Returns:
+        bytes: body of the request.
+    """
+    too_large = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                              detail=f"Body exceeds {max_size} bytes")
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > max_size:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_size:
+            raise too_large
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+@router.post('/bulk', response_model=List[short_url_schemas.ShortURLBulkResult],
+             dependencies=[Depends(RateLimited('bulk'))],
+             openapi_extra={'requestBody': {'required': True, 'content': {
+                 'application/json': {'schema': BULK_ITEMS_SCHEMA},
+                 'application/x-ndjson': {'schema': BULK_ITEMS_SCHEMA}}}})
+async def create_short_urls_bulk(*, db: AsyncSession = Depends(get_session),
+                                 request: Request) -> Any:
+    """Creates short URLs for a batch of original URLs. The body is either a JSON array or
+    newline-delimited JSON objects (application/x-ndjson) with original URLs.
+
+    Args:
+        db (AsyncSession, optional): database session. Defaults to Depends(get_session);
+        request (Request): client request.
+
+    Raises:
+        HTTPException (400): if the body is not valid JSON;
+        HTTPException (413): if the body is too large or the batch contains too many original
+            URLs;
+        HTTPException (422): if any of the items is not a valid original URL;
+        HTTPException (503): if unique short URLs could not be generated.
+
+    Returns:
+        List[short_url_schemas.ShortURLBulkResult]: unique identifier, original URL, shortened
+            URL and status for every item of the batch in the same order.
+    """
+    body = await read_body(request, app_settings.bulk_max_body_size)
+    too_many = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                             detail=f"Batch exceeds {app_settings.bulk_max_size} items")
+    try:
+        if request.headers.get('content-type', '').startswith('application/x-ndjson'):
+            lines = [line for line in body.splitlines() if line.strip()]
+            if len(lines) > app_settings.bulk_max_size:
+                raise too_many
+            items = [orjson.loads(line) for line in lines]
+        else:
+            items = orjson.loads(body)
+        # the size is checked before the items are validated, which is the costly part
+        if isinstance(items, list) and len(items) > app_settings.bulk_max_size:
+            raise too_many
+        entities_in = BULK_ADAPTER.validate_python(items)
+    except orjson.JSONDecodeError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Malformed JSON") from exc
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors()) from exc
+    initial_urls = [entity_in.initial_url for entity_in in entities_in]
+    try:
+        short_urls_db = await short_url_crud.create_many(
+            database=db, initial_urls=initial_urls, provider=short_url_provider,
+            max_attempts=app_settings.short_code_max_attempts,
+            concurrency=app_settings.short_url_provider_concurrency)
+    except ShortURLGenerationError as exc:
+        logger.error(exc)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Short URLs could not be generated") from exc
+    results = []
+    for initial_url in initial_urls:
+        short_url_db, created = short_urls_db[initial_url]
+        if created:
+            short_url_cache.invalidate(short_url_db.id)
+            redirect_cache.invalidate(short_url_db.short_url)
+            item_status = status.HTTP_201_CREATED
+        elif short_url_db.active is False:
+            item_status = status.HTTP_410_GONE
+        else:
+            item_status = status.HTTP_200_OK
+        results.append(short_url_schemas.ShortURLBulkResult(
+            id=short_url_db.id, initial_url=short_url_db.initial_url,
+            short_url=short_url_db.short_url, status=item_status))
+    logger.info("Processed bulk request with %s original URLs", len(initial_urls))
+    return results
+
+
+def to_resolved(short_url_db: Optional[ShortURLs], **missing: Any) -> Dict[str, Any]:
+    """Returns resolution result of a short URL.
+
+    Args:
+        short_url_db (Optional[ShortURLs]): database view of the short URL, None if it does not
+            exist;
+        missing (Any): identifier or short URL of a missing short URL.
+
+    Returns:
+        Dict[str, Any]: resolution result.
+    """
+    if short_url_db is None:
+        return {**missing, 'status': status.HTTP_404_NOT_FOUND}
+    return {'id': short_url_db.id, 'initial_url': short_url_db.initial_url,
+            'short_url': short_url_db.short_url,
+            'status': status.HTTP_410_GONE if short_url_db.active is False else status.HTTP_200_OK}
+
+
+@router.post('/resolve', response_model=List[short_url_schemas.ShortURLResolved])
+async def resolve_short_urls(*, db: AsyncSession = Depends(get_session),
+                             entity_in: short_url_schemas.ShortURLResolveRequest,
+                             request: Request) -> Any:
+    """Resolves a batch of short URLs by their identifiers or short codes. Identifiers found in
+    the in-process cache are served from it, the rest is read with a single query, which fills
+    the caches. Usages are not recorded unless requested.
+
+    Args:
+        db (AsyncSession, optional): database session. Defaults to Depends(get_session);
+        entity_in (short_url_schemas.ShortURLResolveRequest): identifiers and short codes to be
+            resolved;
+        request (Request): client request.
+
+    Raises:
+        HTTPException (413): if the batch contains too many items.
+
+    Returns:
+        List[short_url_schemas.ShortURLResolved]: resolution result for every identifier
+            followed by every short code in the same order.
+    """
+    if len(entity_in.ids) + len(entity_in.codes) > app_settings.bulk_max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Batch exceeds {app_settings.bulk_max_size} items")
+    by_id: Dict[int, Optional[ShortURLs]] = {}
+    for url_id in entity_in.ids:
+        cached = short_url_cache.get(url_id)
+        if cached is not MISSING:
+            by_id[url_id] = cached
+    missing_ids = list({url_id for url_id in entity_in.ids if url_id not in by_id})
+    short_urls = {code: build_short_url(code) for code in entity_in.codes}
+    by_short_url: Dict[str, ShortURLs] = {}
+    if missing_ids or short_urls:
+        for short_url_db in await short_url_crud.read_many(
+                database=db, entity_ids=missing_ids, short_urls=list(set(short_urls.values()))):
+            by_id[short_url_db.id] = by_short_url[short_url_db.short_url] = short_url_db
+            short_url_cache.set(short_url_db.id, short_url_db)
+        for url_id in missing_ids:
+            if url_id not in by_id:
+                by_id[url_id] = None
+                short_url_cache.set(url_id, None)
+    results = [to_resolved(by_id[url_id], id=url_id) for url_id in entity_in.ids]
+    results += [to_resolved(by_short_url.get(short_urls[code]), short_url=short_urls[code])
+                for code in entity_in.codes]
+    if entity_in.record_usage:
+        usages = [usage_schemas.UsageCreate(url_id=result['id'], client_host=request.client.host,
+                                            client_port=request.client.port)
+                  for result in results if result['status'] == status.HTTP_200_OK]
+        # only the usages which the recorder has not queued are written here
+        unrecorded = [usage.model_dump() for usage in usages
+                      if not await usage_recorder.record(usage)]
+        if unrecorded:
+            await usage_crud.create_many(database=db, rows=unrecorded)
+    return results
+
+
 @router.get('/{url_id}', response_model=short_url_schemas.ShortURLBase,
-            status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            dependencies=[Depends(RateLimited('redirect'))])
 async def get_initial_url(*, db: AsyncSession = Depends(get_session),
                           short_url_db: ShortURLs = Depends(get_url), request: Request) -> Any:
-    """Returns original URL.
+    """Returns original URL. The usage is queued for a batched write if the usage recorder is
+    running, otherwise it is written before responding.
 
     Args:
         db (AsyncSession, optional): database session. Defaults to Depends(get_session);
@@ -92,61 +310,192 @@ async def get_initial_url(*, db: AsyncSession = Depends(get_session),
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Item deleted")
     logger.info("Accessing original URL %s via short URL %s from client with host: %s, port: %s",
                 short_url_db.initial_url, short_url_db.short_url, request.client.host,
-                request.client.port)
-    await usage_crud.create(database=db, obj_in=usage_schemas.UsageCreate(
-        url_id=short_url_db.id,
-        client_host=request.client.host,
-        client_port=request.client.port))
+                request.client.port, extra={'sampled': True})
+    usage = usage_schemas.UsageCreate(url_id=short_url_db.id,
+                                      client_host=request.client.host,
+                                      client_port=request.client.port)
+    if not await usage_recorder.record(usage):
+        await usage_crud.create_many(database=db, rows=[usage.model_dump()])
     return short_url_schemas.ShortURLBase(initial_url=short_url_db.initial_url)
 
 
-@router.get('/{url_id}/status', response_model=Union[int, List[usage_schemas.Usage]])
-async def get_usage_status(*, db: AsyncSession = Depends(get_session),
+@router.get('/{url_id}/status',
+            response_model=Union[int, List[usage_schemas.Usage], usage_schemas.UsagePage])
+async def get_usage_status(*, db: AsyncSession = Depends(get_read_session),
                            short_url_db: ShortURLs = Depends(get_url),
                            full_info: bool = Query(default=False, alias='full-info'),
-                           pagination_parameters: Dict[str, int] =
+                           pagination_parameters: Dict[str, Any] =
                            Depends(get_pagination_parameters)) -> Any:
     """Returns usage status of the requested URL.
 
     Args:
-        db (AsyncSession, optional): database session. Defaults to Depends(get_session);
+        db (AsyncSession, optional): database session. Defaults to Depends(get_read_session);
         short_url_db (ShortURLs): database view for the requested url_id;
         full_info (bool): False for obtaining total number of requests, True -
             for additional detailed information about each request: date and time of each
             request, information about the client who completed the request. Defaults to False;
-        pagination_parameters (Dict[str, int]): dictionary with pagination parameters containing
-            the following fields: max_result - number of rows returned by a query (defaults to 10)
-            and offset - skips the query by the specified number of rows (defaults to 0).
+        pagination_parameters (Dict[str, Any]): dictionary with pagination parameters containing
+            the following fields: max_result - number of rows returned by a query (defaults to 10),
+            offset - skips the query by the specified number of rows (defaults to 0) and
+            cursor - switches to cursor pagination (defaults to None).
 
     Raises:
+        HTTPException (400): if the cursor is malformed;
         HTTPException (404): if a URL with requested url_id does not exist.
 
     Returns:
-        Union[int, List[Usage]]: total number of requests in case of full_info=False,
+        Union[int, List[Usage], UsagePage]: total number of requests in case of full_info=False,
             otherwise a dictionary with information about date and time of each request and
-            client host and port who completed the request.
+            client host and port who completed the request, which is wrapped in a page with
+            the cursor of the next page in case of cursor pagination.
     """
     logger.info("Accessing usage status of original URL %s with shortened version %s",
                 short_url_db.initial_url, short_url_db.short_url)
+    if full_info and pagination_parameters['cursor'] is not None:
+        max_result = pagination_parameters['max_result']
+        # one more usage is requested to find out whether the next page exists
+        usages = await usage_crud.get_usages_after(database=db, url_id=short_url_db.id,
+                                                   after=pagination_parameters['cursor'],
+                                                   limit=max_result + 1)
+        next_cursor = None
+        if len(usages) > max_result:
+            last = usages[max_result - 1]
+            next_cursor = encode_cursor(last.usage_datetime, last.id)
+        return usage_schemas.UsagePage(items=usages[:max_result], next_cursor=next_cursor)
     return await usage_crud.get_status(database=db, url_id=short_url_db.id, full_info=full_info,
                                        pagination_parameters=pagination_parameters)
 
 
+def to_utc(moment: datetime) -> datetime:
+    """Converts date and time to naive UTC, as they are stored in the database.
+
+    Args:
+        moment (datetime): naive UTC or timezone-aware date and time.
+
+    Returns:
+        datetime: naive UTC date and time.
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@router.get('/{url_id}/stats', response_model=List[usage_schemas.UsageBucket])
+async def get_usage_stats(*, db: AsyncSession = Depends(get_read_session),
+                          short_url_db: ShortURLs = Depends(get_url),
+                          start: Optional[datetime] = Query(default=None, alias='from'),
+                          end: Optional[datetime] = Query(default=None, alias='to'),
+                          granularity: Literal['minute', 'hour', 'day'] = 'hour') -> Any:
+    """Returns numbers of requests of the requested URL per time bucket.
+
+    Args:
+        db (AsyncSession, optional): database session. Defaults to Depends(get_read_session);
+        short_url_db (ShortURLs): database view for the requested url_id;
+        start (Optional[datetime]): beginning of the time range. Defaults to a day before its end;
+        end (Optional[datetime]): end of the time range. Defaults to the current time;
+        granularity (str): length of the time buckets: 'minute', 'hour' or 'day'.
+            Defaults to 'hour'.
+
+    Raises:
+        HTTPException (404): if a URL with requested url_id does not exist;
+        HTTPException (422): if the time range is empty or spans too many buckets.
+
+    Returns:
+        List[UsageBucket]: start of every time bucket containing requests and number of requests
+            made within it.
+    """
+    end = to_utc(end) if end else datetime.utcnow()
+    start = to_utc(start) if start else end - timedelta(days=1)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Time range is empty")
+    if (end - start) / GRANULARITIES[granularity] > app_settings.stats_max_buckets:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Time range spans too many buckets")
+    return await usage_crud.get_stats(database=db, url_id=short_url_db.id,
+                                      granularity=granularity, start=start, end=end)
+
+
+EXPORT_COLUMNS = ('url_id', 'usage_datetime', 'client_host', 'client_port')
+EXPORT_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+async def stream_usages(bind: AsyncEngine, url_id: int, export_format: str) -> AsyncIterator[bytes]:
+    """Serializes usages of the URL partition by partition. The session is opened here, as
+    the sessions of dependencies are closed before a streaming response is sent.
+
+    Args:
+        bind (AsyncEngine): database engine;
+        url_id (int): unique identifier of the requested URL;
+        export_format (str): 'ndjson' or 'csv'.
+
+    Yields:
+        bytes: serialized partition of usages.
+    """
+    if export_format == 'csv':
+        yield (','.join(EXPORT_COLUMNS) + '\r\n').encode()
+    async with AsyncSession(bind) as session:
+        async for partition in usage_crud.stream(database=session, url_id=url_id,
+                                                 partition_size=app_settings.export_partition_size):
+            if export_format == 'ndjson':
+                yield b''.join(orjson.dumps(row._asdict()) + b'\n' for row in partition)
+            else:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(
+                    (url, moment.isoformat(), host, port) for url, moment, host, port in partition)
+                yield buffer.getvalue().encode()
+
+
+@router.get('/{url_id}/export', response_class=StreamingResponse)
+async def export_usages(*, db: AsyncSession = Depends(get_read_session),
+                        short_url_db: ShortURLs = Depends(get_url),
+                        export_format: Literal['ndjson', 'csv'] = Query(default='ndjson',
+                                                                        alias='format')) -> Any:
+    """Streams full usage history of the requested URL. Memory usage does not depend on the
+    size of the history, as usages are fetched through a server-side cursor.
+
+    Args:
+        db (AsyncSession, optional): database session. Defaults to Depends(get_read_session);
+        short_url_db (ShortURLs): database view for the requested url_id;
+        export_format (str): 'ndjson' for a JSON object per line or 'csv'. Defaults to 'ndjson'.
+
+    Raises:
+        HTTPException (404): if a URL with requested url_id does not exist.
+
+    Returns:
+        StreamingResponse: usages with date and time of each request and client host and port
+            who completed the request ordered by date and time.
+    """
+    logger.info("Exporting usages of original URL %s with shortened version %s",
+                short_url_db.initial_url, short_url_db.short_url)
+    return StreamingResponse(
+        stream_usages(bind=db.bind, url_id=short_url_db.id, export_format=export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={'Content-Disposition':
+                 f'attachment; filename="usages_{short_url_db.id}.{export_format}"'})
+
+
 @router.delete('/{url_id}', status_code=status.HTTP_200_OK)
-async def delete_url(*, db: AsyncSession = Depends(get_session),
-                     short_url_db: ShortURLs = Depends(get_url), url_id: int) -> None:
+async def delete_url(*, db: AsyncSession = Depends(get_session), url_id: int) -> None:
     """Removes short URL by its ID. The entry in the database remains, but is marked as 'deleted'.
+    The URL is looked up on the primary, as the in-process cache and the replicas might not
+    have seen a previous deletion yet.
 
     Args:
         db (AsyncSession, optional): database session. Defaults to Depends(get_session);
-        short_url_db (ShortURLs): database view for the requested url_id.
+        url_id (int): unique identifier of the URL.
 
     Raises:
         HTTPException (404): if a URL with requested url_id does not exist;
         HTTPException (410): if a URL has been already marked as deleted.
     """
+    short_url_db = await short_url_crud.read(database=db, entity_id=url_id)
+    if short_url_db is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     if short_url_db.active is False:
         raise HTTPException(status_code=status.HTTP_410_GONE, detail="Item already deleted")
     logger.info("Original URL %s with shortened version %s was marked as deleted",
                 short_url_db.initial_url, short_url_db.short_url)
     await short_url_crud.delete(database=db, entity_id=url_id)
+    short_url_cache.invalidate(url_id)
+    redirect_cache.invalidate(short_url_db.short_url)
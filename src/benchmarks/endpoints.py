@@ -0,0 +1,201 @@
+"""Benchmark of the hot endpoints: getting original URLs, creating short URLs and usage status.
+
+Seeds the database configured by DATABASE_DSN with benchmark URLs and their usages, drives every
+endpoint with a fixed number of concurrent clients and prints latency percentiles and throughput
+as JSON, so the results of different commits can be compared. Requests are sent in-process
+through the ASGI transport of httpx by default or over a real socket with --base-url to a server
+using the same database and started with RATE_LIMITS='{}'.
+
+Usage:
+    python -m benchmarks.endpoints --urls 1000 --usages 100000 --requests 2000 --concurrency 10
+"""
+import argparse
+import asyncio
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from httpx import AsyncClient, Limits, Response
+import orjson
+from sqlalchemy import func, select
+
+from core.config import app_settings
+from db.db import async_session
+from main import app
+from models.models import Usages
+from services.short_code_services import short_url_provider
+from services.short_url_services import short_url_crud
+from services.usage_services import usage_crud
+
+
+SEED_URL = 'https://benchmark.example.com/urls/{}'
+CREATED_URL = 'https://benchmark.example.com/created/{}'
+SEED_BATCH_SIZE = 10000
+# every usage may add three rollup rows of four parameters, which have to stay within the limit
+# of 32767 parameters of a statement
+SEED_USAGE_BATCH_SIZE = 2000
+
+
+async def seed(urls: int, usages: int) -> List[int]:
+    """Creates the benchmark URLs and tops their usages up to the requested number, so repeated
+    runs work with the same data.
+
+    Args:
+        urls (int): number of original URLs;
+        usages (int): total number of usages of the original URLs.
+
+    Returns:
+        List[int]: identifiers of the benchmark URLs.
+    """
+    url_ids: List[int] = []
+    async with async_session() as session:
+        for start in range(0, urls, SEED_BATCH_SIZE):
+            created = await short_url_crud.create_many(
+                session, [SEED_URL.format(index)
+                          for index in range(start, min(start + SEED_BATCH_SIZE, urls))],
+                provider=short_url_provider, max_attempts=app_settings.short_code_max_attempts)
+            url_ids.extend(short_url_db.id for short_url_db, _ in created.values())
+        existing = await session.scalar(select(func.count()).select_from(Usages)
+                                        .where(Usages.url_id.in_(url_ids)))
+        now = datetime.utcnow()
+        for start in range(existing, usages, SEED_USAGE_BATCH_SIZE):
+            await usage_crud.create_many(session, [
+                {'url_id': random.choice(url_ids), 'client_host': '192.0.2.1',
+                 'client_port': random.randint(1024, 65535),
+                 'usage_datetime': now - timedelta(seconds=random.uniform(0, 30 * 24 * 3600))}
+                for _ in range(min(SEED_USAGE_BATCH_SIZE, usages - start))])
+            await session.commit()
+    return url_ids
+
+
+async def drive(send: Callable[[], Any], requests: int,
+                concurrency: int) -> Dict[str, Any]:
+    """Sends requests from concurrent clients and measures them.
+
+    Args:
+        send (Callable[[], Any]): coroutine function sending a single request;
+        requests (int): total number of requests;
+        concurrency (int): number of concurrent clients.
+
+    Returns:
+        Dict[str, Any]: throughput, latency percentiles in milliseconds and numbers of
+            responses by status code.
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def client() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            response: Response = await send()
+            latencies.append(time.perf_counter() - started)
+            status = str(response.status_code)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'requests': requests, 'duration_s': round(duration, 3),
+            'throughput_rps': round(requests / duration, 1),
+            'latency_ms': {'p50': round(percentiles[49] * 1e3, 3),
+                           'p95': round(percentiles[94] * 1e3, 3),
+                           'p99': round(percentiles[98] * 1e3, 3),
+                           'max': round(max(latencies) * 1e3, 3)},
+            'statuses': statuses}
+
+
+def build_scenarios(client: AsyncClient, url_ids: List[int]) -> Dict[str, Callable[[], Any]]:
+    """Returns functions sending a request to every benchmarked endpoint.
+
+    Args:
+        client (AsyncClient): HTTP client;
+        url_ids (List[int]): identifiers of the benchmark URLs.
+
+    Returns:
+        Dict[str, Callable[[], Any]]: coroutine functions keyed by the endpoints.
+    """
+    def get_initial_url() -> Any:
+        return client.get(app.url_path_for('get_initial_url', url_id=random.choice(url_ids)))
+
+    def create_short_url() -> Any:
+        return client.post(app.url_path_for('create_short_url'),
+                           json={'initial_url': CREATED_URL.format(uuid.uuid4())})
+
+    def get_usage_status() -> Any:
+        return client.get(app.url_path_for('get_usage_status', url_id=random.choice(url_ids)))
+
+    def get_usage_status_full() -> Any:
+        return client.get(app.url_path_for('get_usage_status', url_id=random.choice(url_ids)),
+                          params={'full-info': 'true'})
+
+    return {'get_initial_url': get_initial_url, 'create_short_url': create_short_url,
+            'get_usage_status': get_usage_status, 'get_usage_status_full': get_usage_status_full}
+
+
+def get_commit() -> Optional[str]:
+    """Returns the current git commit, if the source is a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, check=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Seeds the database and measures the endpoints.
+
+    Args:
+        args (argparse.Namespace): command line arguments.
+
+    Returns:
+        Dict[str, Any]: parameters of the run and results keyed by the endpoints.
+    """
+    random.seed(args.seed)
+    url_ids = await seed(args.urls, args.usages)
+    async with AsyncExitStack() as stack:
+        if args.base_url:
+            client = AsyncClient(base_url=args.base_url,
+                                 limits=Limits(max_connections=args.concurrency))
+        else:
+            # the benchmark measures the endpoints, not the rate limits
+            app_settings.rate_limits = {}
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = AsyncClient(app=app, base_url='http://benchmark')
+        await stack.enter_async_context(client)
+        results = {}
+        for name, send in build_scenarios(client, url_ids).items():
+            if args.scenarios and name not in args.scenarios:
+                continue
+            if args.warm_up:
+                await drive(send, args.warm_up, args.concurrency)
+            results[name] = await drive(send, args.requests, args.concurrency)
+    return {'commit': get_commit(), 'mode': 'socket' if args.base_url else 'in-process',
+            'urls': args.urls, 'usages': args.usages, 'concurrency': args.concurrency,
+            'results': results}
+
+
+def main() -> None:
+    """Parses command line arguments and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, default=1000)
+    parser.add_argument('--usages', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warm-up', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='*', help='endpoints to measure, all by default')
+    parser.add_argument('--base-url', help='URL of a running server, in-process by default')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random choices')
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark of the black list check as a route dependency and as ASGI middleware.
+
+Usage:
+    python -m benchmarks.ip_filter --requests 20000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from fastapi import Depends, FastAPI, Request, status
+from fastapi.exceptions import HTTPException
+from fastapi.responses import ORJSONResponse
+import orjson
+from starlette.types import ASGIApp, Message
+
+from api.v1.middleware import BlackListMiddleware
+from core.ip_filter import IPFilter
+
+
+ALLOWED_HOST = '192.0.2.1'
+BLOCKED_HOST = '198.51.100.1'
+
+
+def build_apps(ip_filter: IPFilter) -> Dict[str, ASGIApp]:
+    """Builds applications with a trivial route checking clients either way.
+
+    Args:
+        ip_filter (IPFilter): black list.
+
+    Returns:
+        Dict[str, ASGIApp]: applications keyed by the way of the check.
+    """
+    async def check_allowed_ip(request: Request) -> None:
+        if request.client.host in ip_filter:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    async def ping() -> Dict[str, Any]:
+        return {}
+
+    dependency_app = FastAPI(default_response_class=ORJSONResponse,
+                             dependencies=[Depends(check_allowed_ip)])
+    dependency_app.get('/ping')(ping)
+    middleware_app = FastAPI(default_response_class=ORJSONResponse)
+    middleware_app.add_middleware(BlackListMiddleware, ip_filter=ip_filter)
+    middleware_app.get('/ping')(ping)
+    return {'dependency': dependency_app, 'middleware': middleware_app}
+
+
+async def call(app: ASGIApp, host: str) -> int:
+    """Sends a single GET request to the application without a network stack.
+
+    Args:
+        app (ASGIApp): application;
+        host (str): client address.
+
+    Returns:
+        int: response status code.
+    """
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': '/ping', 'raw_path': b'/ping', 'root_path': '',
+             'query_string': b'', 'headers': [(b'host', b'benchmark')],
+             'client': (host, 50000), 'server': ('benchmark', 80)}
+    messages: List[Message] = []
+
+    async def receive() -> Message:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]['status']
+
+
+async def measure(app: ASGIApp, host: str, requests: int) -> float:
+    """Returns mean time of a request in microseconds"""
+    for _ in range(min(requests, 1000)):
+        await call(app, host)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, host)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(requests: int, networks: int) -> Dict[str, Dict[str, float]]:
+    """Measures every way of the check for allowed and blocked clients.
+
+    Args:
+        requests (int): number of requests per measurement;
+        networks (int): number of networks in the black list.
+
+    Returns:
+        Dict[str, Dict[str, float]]: mean request times in microseconds.
+    """
+    black_list = [f'10.{index // 256 % 256}.{index % 256}.0/24' for index in range(networks)]
+    ip_filter = IPFilter([*black_list, f'{BLOCKED_HOST}/32'], path=None, reload_interval=0)
+    results = {}
+    for name, app in build_apps(ip_filter).items():
+        assert await call(app, ALLOWED_HOST) == status.HTTP_200_OK
+        assert await call(app, BLOCKED_HOST) == status.HTTP_403_FORBIDDEN
+        results[name] = {'allowed_us': await measure(app, ALLOWED_HOST, requests),
+                         'blocked_us': await measure(app, BLOCKED_HOST, requests)}
+    return results
+
+
+def main() -> None:
+    """Parses command line arguments and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--networks', type=int, default=10000)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.requests, args.networks))
+    print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
+
+
+if __name__ == '__main__':
+    main()
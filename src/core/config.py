@@ -1,21 +1,135 @@
 """App configuration"""
-from typing import List
+import string
+from typing import Dict, List, Literal, Optional
 
-from pydantic import PostgresDsn
+from pydantic import BaseModel, PostgresDsn, field_validator
 from pydantic_settings import BaseSettings
 
 from core.logger import set_logger
 
 
-set_logger()
+class RateLimit(BaseModel):
+    """Sustained number of requests per second and number of requests allowed at once"""
+    rate: float
+    burst: int
 
 
 class AppSettings(BaseSettings):
     """Contains application settings"""
     app_title: str = 'URL Shortener'
+    # records are formatted and written by background threads as 'text' or 'json' lines,
+    # log_sample_rate is the share of lines logged for every request which are kept
+    log_level: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'] = 'INFO'
+    log_format: Literal['text', 'json'] = 'text'
+    log_sample_rate: float = 1.0
     database_dsn: PostgresDsn
+    # connection pool of every worker, timeout and recycle are in seconds, the warm-up opens
+    # database_pool_warm_up connections on startup
+    database_echo: bool = False
+    database_pool_size: int = 10
+    database_max_overflow: int = 10
+    database_pool_timeout: float = 30
+    database_pool_recycle: int = 1800
+    database_pool_pre_ping: bool = False
+    database_pool_warm_up: int = 10
+    # prepared statements cached per connection by asyncpg and by SQLAlchemy, 0 disables them,
+    # which is required behind PgBouncer in transaction mode
+    database_statement_cache_size: int = 100
+    database_prepared_statement_cache_size: int = 100
+    # redirects and usage reads are sent to the replicas, if any, chosen 'round-robin' or by
+    # 'least-latency' of the health checks made every database_replica_check_interval seconds
+    database_replica_dsns: List[PostgresDsn] = []
+    database_replica_selection: Literal['round-robin', 'least-latency'] = 'round-robin'
+    database_replica_check_interval: float = 5
+    # rows read from the replicas are cached in-process for at most database_replica_max_lag
+    # seconds and are not put into the shared cache, as they may miss the latest deletions
+    database_replica_max_lag: float = 1
+    # addresses or networks in CIDR notation, more of them can be listed in black_list_path,
+    # which is checked for changes every black_list_reload_interval seconds
     black_list: List[str] = ['172.19.0.0',
                              ]
+    black_list_path: Optional[str] = None
+    black_list_reload_interval: float = 10
+    # limits of every client per group of routes: 'create', 'bulk' and 'redirect', 'memory'
+    # keeps them per worker, 'unix' shares them between workers through the cache server
+    rate_limits: Dict[str, RateLimit] = {'create': RateLimit(rate=10, burst=100),
+                                         'bulk': RateLimit(rate=1, burst=10),
+                                         'redirect': RateLimit(rate=100, burst=200)}
+    rate_limit_backend: Literal['memory', 'unix'] = 'memory'
+    rate_limit_max_clients: int = 100000
+    # metrics are exposed at /metrics, with metrics_directory set every worker writes its
+    # metrics there every metrics_flush_interval seconds and /metrics aggregates all of them
+    metrics_directory: Optional[str] = None
+    metrics_flush_interval: float = 5
+    # short URLs are built as '<short_url_base>/<code>' by the local providers
+    short_url_base: str = 'http://localhost:8000'
+    # 'sequence' and 'hash' generate codes locally, 'tinyurl' calls the external TinyURL service
+    short_url_provider: Literal['sequence', 'hash', 'tinyurl'] = 'sequence'
+    # maximum number of short URLs of a bulk request generated by the provider at once
+    short_url_provider_concurrency: int = 16
+    short_code_alphabet: str = string.digits + string.ascii_letters
+    short_code_length: int = 7
+    short_code_secret: str = ''
+    short_code_max_attempts: int = 5
+    # original URLs differing only in the case of scheme and host, default ports or order of
+    # query parameters share a short URL if enabled
+    canonicalize_urls: bool = False
+    # numbers leased by a worker at once and the remaining share that triggers the next lease
+    short_code_block_size: int = 1000
+    short_code_refill_threshold: float = 0.1
+    # time in seconds for which clients may reuse a redirect without recording a usage
+    redirect_max_age: int = 0
+    # in-process cache of short URLs, time to live is in seconds
+    cache_max_size: int = 10000
+    cache_ttl: float = 300
+    cache_negative_ttl: float = 5
+    # cache shared between workers: 'memory' keeps entries in the worker, 'unix' connects to
+    # `python -m services.cache_server` listening on shared_cache_socket, 'none' disables it
+    shared_cache_backend: Literal['none', 'memory', 'unix'] = 'memory'
+    shared_cache_socket: str = '/tmp/url_shortener_cache.sock'
+    # Postgres channel broadcasting deleted short URLs to all workers
+    cache_invalidation_channel: str = 'short_url_invalidation'
+    # usages are written in batches of usage_batch_size at least every usage_flush_interval
+    # seconds, usage_overflow_policy applies when usage_queue_size usages are waiting
+    usage_queue_size: int = 10000
+    usage_batch_size: int = 500
+    usage_flush_interval: float = 1.0
+    usage_overflow_policy: Literal['block', 'drop', 'spill'] = 'block'
+    usage_spill_path: str = '/tmp/url_shortener_usages.ndjson'
+    # time in seconds the shutdown waits for the buffered usages to be written
+    usage_stop_timeout: float = 30
+    # usages are partitioned by 'day' or 'month', `python maintenance.py manage-partitions`
+    # creates usage_partitions_ahead future partitions and drops or detaches the ones older than
+    # usage_retention_days, 0 keeps them forever
+    usage_partition_interval: Literal['day', 'month'] = 'month'
+    usage_partitions_ahead: int = 3
+    usage_retention_days: int = 0
+    usage_retention_action: Literal['drop', 'detach'] = 'drop'
+    # maximum number of time buckets a usage statistics request may span
+    stats_max_buckets: int = 10000
+    # number of usages fetched and serialized at once by the export
+    export_partition_size: int = 1000
+    # maximum number of original URLs and of bytes of the body of a bulk request
+    bulk_max_size: int = 10000
+    bulk_max_body_size: int = 16 * 1024 * 1024
+
+    @field_validator('short_code_alphabet')
+    @classmethod
+    def check_alphabet(cls, value: str) -> str:
+        """Checks that the short code alphabet can be used for encoding.
+
+        Args:
+            value (str): short code alphabet.
+
+        Raises:
+            ValueError: if the alphabet is too short or contains repeated characters.
+
+        Returns:
+            str: short code alphabet.
+        """
+        if len(value) < 2 or len(set(value)) != len(value):
+            raise ValueError('alphabet must contain at least two unique characters')
+        return value
 
     class Config:
         """Application environment variables"""
@@ -23,4 +137,4 @@ class AppSettings(BaseSettings):
 
 
 app_settings = AppSettings()
- 
\ No newline at end of file
+set_logger(app_settings.log_level, app_settings.log_format, app_settings.log_sample_rate)
@@ -0,0 +1,140 @@
+"""Contains the matcher of client addresses against the black list"""
+import asyncio
+from bisect import bisect_right
+import ipaddress
+import os
+import socket
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.config import app_settings
+from core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+def to_integer(address: str) -> Optional[Tuple[int, int]]:
+    """Converts a textual IP address to an integer. IPv4-mapped IPv6 addresses are converted
+    to IPv4 ones.
+
+    Args:
+        address (str): IPv4 or IPv6 address.
+
+    Returns:
+        Optional[Tuple[int, int]]: IP version and the address as an integer or None if the
+            address is not valid.
+    """
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+    except OSError:
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address), 'big')
+    except OSError:
+        return None
+    if value >> 32 == 0xffff:
+        return 4, value & 0xffffffff
+    return 6, value
+
+
+class IPMatcher:
+    """Matches addresses against IPv4 and IPv6 networks, which are compiled into sorted
+    non-overlapping integer intervals, so a lookup is a binary search.
+    """
+    def __init__(self, networks: Iterable[str]):
+        intervals: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            parsed = ipaddress.ip_network(network.strip(), strict=False)
+            intervals[parsed.version].append((int(parsed.network_address),
+                                              int(parsed.broadcast_address)))
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        for version, version_intervals in intervals.items():
+            starts, ends = self._starts[version], self._ends[version] = [], []
+            for start, end in sorted(version_intervals):
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def __contains__(self, address: str) -> bool:
+        converted = to_integer(address)
+        if converted is None:
+            return False
+        version, value = converted
+        index = bisect_right(self._starts[version], value) - 1
+        return index >= 0 and value <= self._ends[version][index]
+
+
+class IPFilter:
+    """Black list of the networks from the settings and from an optional file with a network
+    per line, in which empty lines and lines starting with '#' are ignored. Once started, the
+    file is checked for changes every `reload_interval` seconds in a background task and
+    reloaded without a restart, so lookups never touch the file.
+    """
+    def __init__(self, networks: List[str], path: Optional[str], reload_interval: float):
+        self._networks = networks
+        self._path = path
+        self._reload_interval = reload_interval
+        self._modified_at: Optional[float] = None
+        self._matcher = IPMatcher(networks)
+        self._task: Optional[asyncio.Task] = None
+        if path:
+            self.reload()
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._matcher
+
+    async def start(self) -> None:
+        """Starts checking the file for changes in the background"""
+        if self._path and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops checking the file for changes"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        """Reloads the file periodically, the file is read and the matcher is built in a
+        thread, so the event loop is not blocked
+        """
+        while True:
+            await asyncio.sleep(self._reload_interval)
+            await asyncio.to_thread(self.reload)
+
+    def reload(self) -> None:
+        """Rebuilds the matcher if the file has changed, keeps the current one if the file
+        cannot be read.
+        """
+        try:
+            modified_at = os.stat(self._path).st_mtime
+            if modified_at == self._modified_at:
+                return
+            with open(self._path, encoding='utf-8') as black_list_file:
+                lines = [line.strip() for line in black_list_file]
+        except OSError as exc:
+            logger.error("Failed to read black list %s: %s", self._path, exc)
+            return
+        networks = list(self._networks)
+        for line in lines:
+            if not line or line.startswith('#'):
+                continue
+            try:
+                ipaddress.ip_network(line, strict=False)
+            except ValueError:
+                logger.warning("Skipping malformed network %r in black list %s", line, self._path)
+                continue
+            networks.append(line)
+        self._matcher = IPMatcher(networks)
+        self._modified_at = modified_at
+        logger.info("Loaded black list %s with %s ranges", self._path, len(self._matcher))
+
+
+black_list = IPFilter(app_settings.black_list, path=app_settings.black_list_path,
+                      reload_interval=app_settings.black_list_reload_interval)
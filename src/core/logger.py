@@ -1,6 +1,17 @@
-"""Unicorn server logging"""
+"""Unicorn server logging.
+
+Loggers put records into queues and the configured handlers format and write them on background
+threads, so logging does not block the event loop.
+"""
+import atexit
 import logging
 from logging import config
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import random
+from typing import Any, Dict, List
+
+import orjson
 
 
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -21,6 +32,9 @@ LOGGING = {
             '()': 'uvicorn.logging.AccessFormatter',
             'fmt': "%(levelprefix)s %(client_addr)s - '%(request_line)s' %(status_code)s",
         },
+        'json': {
+            '()': 'core.logger.JSONFormatter',
+        },
     },
     'handlers': {
         'console': {
@@ -61,9 +75,87 @@ LOGGING = {
 }
 
 
-def set_logger() -> None:
-    """Sets up logging"""
-    config.dictConfig(LOGGING)
+# attributes every log record has, the other ones are passed in `extra` and logged as fields
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {
+    'message', 'asctime', 'sampled', 'color_message'}
+
+listeners: List[QueueListener] = []
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as JSON lines with the time, level, logger name and message followed by
+    the fields passed in `extra` and the traceback of the exception, if any
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {'time': self.formatTime(record), 'level': record.levelname,
+                                 'logger': record.name, 'message': record.getMessage()}
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Passes only the given share of records logged with `extra={'sampled': True}`, which
+    marks lines logged for every request, or of all records of loggers, such as the access log,
+    which only log such lines. The other records are always passed.
+    """
+    def __init__(self, rate: float, sample_all: bool = False):
+        super().__init__()
+        self._rate = rate
+        self._sample_all = sample_all
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sampled = self._sample_all or getattr(record, 'sampled', False)
+        return not sampled or random.random() < self._rate
+
+
+class LazyQueueHandler(QueueHandler):
+    """Queue handler which leaves formatting of the record to the handlers of the listener.
+    The standard one formats the message in the logging thread and drops the arguments, which
+    the uvicorn access formatter relies on.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def set_logger(level: str = 'INFO', log_format: str = 'text', sample_rate: float = 1.0) -> None:
+    """Sets up logging. Handlers of the root and uvicorn loggers are moved behind queues served
+    by background threads.
+
+    Args:
+        level (str, optional): level of the root logger. Defaults to 'INFO';
+        log_format (str, optional): 'text' or 'json' lines. Defaults to 'text';
+        sample_rate (float, optional): share of the sampled per-request records which are
+            logged. Defaults to 1.0.
+    """
+    stop_listeners()
+    logging_config = {**LOGGING, 'root': {**LOGGING['root'], 'level': level}}
+    if log_format == 'json':
+        logging_config['handlers'] = {name: {**handler, 'formatter': 'json'}
+                                      for name, handler in LOGGING['handlers'].items()}
+    config.dictConfig(logging_config)
+    # every line of the access log is logged for a request
+    for logger, sample_all in [(logging.getLogger(), False),
+                               (logging.getLogger('uvicorn.access'), True)]:
+        handlers, logger.handlers = logger.handlers, []
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        handler = LazyQueueHandler(records)
+        handler.addFilter(SamplingFilter(sample_rate, sample_all=sample_all))
+        logger.addHandler(handler)
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+
+
+def stop_listeners() -> None:
+    """Writes the queued records and stops the background threads"""
+    while listeners:
+        listeners.pop().stop()
+
+
+atexit.register(stop_listeners)
 
 
 def get_logger(name: str) -> logging.Logger:
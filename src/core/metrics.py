@@ -0,0 +1,345 @@
+"""Contains metrics of the application exposed in the Prometheus text format.
+
+Metrics are kept by every worker in plain dictionaries, which are only updated from the event
+loop, so updates take no locks. With a metrics directory configured, every worker periodically
+writes its metrics to a file there and the worker serving /metrics merges the files of all
+workers: counters and histograms are summed, gauges are summed over the running workers only.
+"""
+import asyncio
+from bisect import bisect_left
+import glob
+import math
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+# upper bounds in seconds of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    """Base of the metrics, which keep a value per combination of label values"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, Any] = {}
+
+    def samples(self) -> List[Tuple[Labels, Any]]:
+        """Returns current values.
+
+        Returns:
+            List[Tuple[Labels, Any]]: label values and the value for each combination of them.
+        """
+        return list(self._values.items())
+
+
+class Value(Metric):
+    """Base of the metrics with a single number per combination of label values, which is
+    either updated by the application or read from a function on every collection
+    """
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._functions: Dict[Labels, Callable[[], float]] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        """Increases the value.
+
+        Args:
+            labels (Labels, optional): label values. Defaults to ();
+            amount (float, optional): increment. Defaults to 1.0.
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set_function(self, function: Callable[[], float], labels: Labels = ()) -> None:
+        """Reads the value from the function on every collection, which suits numbers
+        maintained elsewhere, e.g. sizes of pools and queues or hits of caches.
+
+        Args:
+            function (Callable[[], float]): function returning the current value;
+            labels (Labels, optional): label values. Defaults to ().
+        """
+        self._functions[labels] = function
+
+    def samples(self) -> List[Tuple[Labels, Any]]:
+        for labels, function in self._functions.items():
+            self._values[labels] = float(function())
+        return super().samples()
+
+
+class Counter(Value):
+    """Monotonically increasing number"""
+    kind = 'counter'
+
+
+class Gauge(Value):
+    """Number which can go up and down"""
+    kind = 'gauge'
+
+    def dec(self, labels: Labels = (), amount: float = 1.0) -> None:
+        """Decreases the value.
+
+        Args:
+            labels (Labels, optional): label values. Defaults to ();
+            amount (float, optional): decrement. Defaults to 1.0.
+        """
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+
+class Histogram(Metric):
+    """Distribution of observations counted in buckets with the given upper bounds. Every
+    combination of label values keeps the counts of the buckets followed by the sum of the
+    observations.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """Counts an observation.
+
+        Args:
+            value (float): observed value;
+            labels (Labels, optional): label values. Defaults to ().
+        """
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+class MetricsRegistry:
+    """Metrics of the current worker and, in the multiprocess mode, the files of all workers"""
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._directory: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, metric: Metric) -> Any:
+        """Adds a metric to the registry.
+
+        Args:
+            metric (Metric): metric.
+
+        Raises:
+            ValueError: if a metric with the same name is already registered.
+
+        Returns:
+            Any: the metric itself.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Returns metrics of the current worker.
+
+        Returns:
+            List[Dict[str, Any]]: name, kind, documentation, label names, buckets of histograms
+                and samples of every metric.
+        """
+        return [{'name': metric.name, 'kind': metric.kind,
+                 'documentation': metric.documentation, 'labels': metric.labels,
+                 'buckets': getattr(metric, 'buckets', None),
+                 'samples': [[labels, value] for labels, value in metric.samples()]}
+                for metric in self._metrics.values()]
+
+    async def start(self, directory: Optional[str], interval: float) -> None:
+        """Starts writing metrics of the current worker to the directory.
+
+        Args:
+            directory (Optional[str]): directory shared by the workers, None keeps metrics of
+                every worker to itself;
+            interval (float): time in seconds between the writes.
+        """
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self.write()
+        self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stops the periodic writes and writes the final metrics, so the counters of the
+        worker are kept after it exits
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self.write()
+
+    def write(self, snapshot: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Replaces the file of the current worker with its metrics.
+
+        Args:
+            snapshot (Optional[List[Dict[str, Any]]], optional): metrics in the format of
+                `snapshot`. Defaults to None, which stands for the current metrics.
+        """
+        path = os.path.join(self._directory, f'metrics_{os.getpid()}.json')
+        try:
+            with open(f'{path}.tmp', 'wb') as metrics_file:
+                metrics_file.write(orjson.dumps(snapshot or self.snapshot()))
+            os.replace(f'{path}.tmp', path)
+        except OSError as exc:
+            logger.error("Failed to write metrics to %s: %s", path, exc)
+
+    async def collect(self) -> List[Dict[str, Any]]:
+        """Returns metrics of the current worker merged with the last metrics written by the
+        other workers in the multiprocess mode. The files are read and merged in a thread, so
+        the event loop is not blocked by slow disks or many workers.
+
+        Returns:
+            List[Dict[str, Any]]: metrics in the format of `snapshot`.
+        """
+        own = self.snapshot()
+        if self._directory is None:
+            return own
+        return await asyncio.to_thread(self._merge, own)
+
+    def _merge(self, own: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merges metrics of the current worker with the files of the other workers"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        samples: Dict[str, Dict[Labels, Any]] = {}
+        for pid, snapshot in [(os.getpid(), own), *self._read_others()]:
+            alive = pid == os.getpid() or is_running(pid)
+            for metric in snapshot:
+                if metric['kind'] == 'gauge' and not alive:
+                    continue
+                merged.setdefault(metric['name'], metric)
+                metric_samples = samples.setdefault(metric['name'], {})
+                for labels, value in metric['samples']:
+                    labels = tuple(labels)
+                    total = metric_samples.get(labels)
+                    if total is None:
+                        metric_samples[labels] = value
+                    elif isinstance(value, list):
+                        metric_samples[labels] = [a + b for a, b in zip(total, value)]
+                    else:
+                        metric_samples[labels] = total + value
+        return [{**metric, 'samples': list(samples[name].items())}
+                for name, metric in merged.items()]
+
+    def _read_others(self) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        """Returns process identifiers and the last metrics written by the other workers"""
+        snapshots = []
+        for path in glob.glob(os.path.join(self._directory, 'metrics_*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                if pid == os.getpid():
+                    continue
+                with open(path, 'rb') as metrics_file:
+                    snapshots.append((pid, orjson.loads(metrics_file.read())))
+            except (OSError, ValueError) as exc:
+                logger.warning("Skipping metrics file %s: %s", path, exc)
+        return snapshots
+
+    async def _run(self, interval: float) -> None:
+        """Writes metrics periodically, the metrics are taken on the event loop, which updates
+        them, and written in a thread
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.write, self.snapshot())
+
+
+def is_running(pid: int) -> bool:
+    """Checks whether the process is running.
+
+    Args:
+        pid (int): process identifier.
+
+    Returns:
+        bool: whether the process exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def format_value(value: float) -> str:
+    """Formats a sample value as the Prometheus text format expects"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Formats label names and values as the Prometheus text format expects"""
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"')
+                                      .replace('\n', r'\n'))
+                     for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def render(metrics: List[Dict[str, Any]]) -> str:
+    """Renders metrics in the Prometheus text format.
+
+    Args:
+        metrics (List[Dict[str, Any]]): metrics in the format of `MetricsRegistry.snapshot`.
+
+    Returns:
+        str: metrics in the Prometheus text format.
+    """
+    lines = []
+    for metric in metrics:
+        name, names = metric['name'], list(metric['labels'])
+        lines.append(f"# HELP {name} {metric['documentation']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for labels, value in sorted(metric['samples']):
+            labels = list(labels)
+            if metric['kind'] != 'histogram':
+                lines.append(f'{name}{format_labels(names, labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric['buckets'], math.inf], value[:-1]):
+                cumulative += count
+                bucket_labels = format_labels([*names, 'le'], [*labels, format_value(bound)])
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(names, labels)} {format_value(value[-1])}')
+            lines.append(f'{name}_count{format_labels(names, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+request_duration: Histogram = registry.register(Histogram(
+    'http_request_duration_seconds', 'Time of handling HTTP requests',
+    labels=('method', 'route', 'status')))
+requests_in_progress: Gauge = registry.register(Gauge(
+    'http_requests_in_progress', 'HTTP requests being handled', labels=('method',)))
+query_duration: Histogram = registry.register(Histogram(
+    'db_query_duration_seconds', 'Time of executing database statements',
+    labels=('database', 'operation')))
+pool_wait: Histogram = registry.register(Histogram(
+    'db_pool_checkout_wait_seconds', 'Time of waiting for a pooled database connection',
+    labels=('database',)))
+pool_size: Gauge = registry.register(Gauge(
+    'db_pool_size', 'Configured size of the database connection pool', labels=('database',)))
+pool_connections: Gauge = registry.register(Gauge(
+    'db_pool_connections', 'Open database connections by state', labels=('database', 'state')))
+cache_lookups: Counter = registry.register(Counter(
+    'cache_lookups_total', 'Lookups of in-process caches', labels=('cache', 'result')))
+usage_queue_depth: Gauge = registry.register(Gauge(
+    'usage_queue_depth', 'Usages waiting to be written to the database'))
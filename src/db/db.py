@@ -1,12 +1,187 @@
 """Contains code responsible for connecting to the database"""
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+from contextlib import AsyncExitStack
+import itertools
+import logging
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from core.config import app_settings
+from core.logger import get_logger
+from core.metrics import pool_connections, pool_size, pool_wait, query_duration
+
+
+logger = get_logger(__name__)
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    """Connection pool reporting how long checkouts wait for a free connection"""
+    database = ''
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - started, (self.database,))
+
+    def recreate(self) -> 'TimedPool':
+        pool = super().recreate()
+        pool.database = self.database
+        return pool
+
+
+# SQLAlchemy logs pools under the module of their class, so this logger is kept at the level of
+# the 'sqlalchemy' loggers and messages like 'Pool recreating' stay out of the application logs
+get_logger(f'{TimedPool.__module__}.{TimedPool.__name__}').setLevel(logging.WARNING)
+
+
+def before_cursor_execute(_connection: Connection, _cursor: Any, _statement: str,
+                          _parameters: Any, context: ExecutionContext,
+                          _executemany: bool) -> None:
+    """Remembers when the statement is sent to the database"""
+    context.query_started = time.perf_counter()
+
+
+def after_cursor_execute(connection: Connection, _cursor: Any, statement: str,
+                         _parameters: Any, context: ExecutionContext,
+                         _executemany: bool) -> None:
+    """Reports the time of executing the statement by its first keyword"""
+    operation = statement.split(None, 1)[0].upper() if statement else ''
+    query_duration.observe(time.perf_counter() - context.query_started,
+                           (connection.engine.pool.database, operation))
+
+
+def build_engine(dsn: str) -> AsyncEngine:
+    """Creates a database engine with the connection pool configured by the settings. Time of
+    statements, waits for connections and usage of the pool are reported as metrics labeled
+    with the host, port and name of the database.
+
+    Args:
+        dsn (str): database URL.
+
+    Returns:
+        AsyncEngine: database engine.
+    """
+    bind = create_async_engine(
+        dsn, echo=app_settings.database_echo, future=True, poolclass=TimedPool,
+        pool_size=app_settings.database_pool_size,
+        max_overflow=app_settings.database_max_overflow,
+        pool_timeout=app_settings.database_pool_timeout,
+        pool_recycle=app_settings.database_pool_recycle,
+        pool_pre_ping=app_settings.database_pool_pre_ping,
+        # statement_cache_size is passed to asyncpg.connect, prepared_statement_cache_size is the
+        # size of the cache of prepared statements kept by the SQLAlchemy dialect
+        connect_args={'statement_cache_size': app_settings.database_statement_cache_size,
+                      'prepared_statement_cache_size':
+                          app_settings.database_prepared_statement_cache_size},
+    )
+    url = bind.url
+    database = bind.sync_engine.pool.database = f'{url.host}:{url.port or 5432}/{url.database}'
+    event.listen(bind.sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(bind.sync_engine, 'after_cursor_execute', after_cursor_execute)
+    # the pool is looked up on every collection, as disposing the engine replaces it
+    pool_size.set_function(lambda: bind.sync_engine.pool.size(), (database,))
+    pool_connections.set_function(lambda: bind.sync_engine.pool.checkedout(),
+                                  (database, 'in_use'))
+    pool_connections.set_function(lambda: bind.sync_engine.pool.checkedin(), (database, 'idle'))
+    return bind
+
+
+class ReplicaRouter:
+    """Chooses the engine for read-only queries among the replicas, either in turn
+    ('round-robin') or the one which answered the last health check the fastest
+    ('least-latency'). Replicas failing the health check are skipped until they recover,
+    the primary is used if there are no available replicas.
+    """
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], selection: str):
+        self._primary = primary
+        self._replicas = replicas
+        self._selection = selection
+        self._latencies: Dict[AsyncEngine, float] = {replica: 0.0 for replica in replicas}
+        self._turn = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> List[AsyncEngine]:
+        """Replica engines which passed the last health check"""
+        return [replica for replica in self._replicas if self._latencies[replica] != math.inf]
+
+    def choose(self) -> AsyncEngine:
+        """Returns the engine for a read-only session.
+
+        Returns:
+            AsyncEngine: replica engine or the primary one if no replica is available.
+        """
+        available = self.available
+        if not available:
+            return self._primary
+        if self._selection == 'least-latency':
+            return min(available, key=self._latencies.__getitem__)
+        return available[next(self._turn) % len(available)]
+
+    async def check(self, timeout: float) -> None:
+        """Measures the latency of every replica with a trivial query.
+
+        Args:
+            timeout (float): time in seconds after which a replica is considered unavailable.
+        """
+        latencies = await asyncio.gather(*(self._measure(replica, timeout)
+                                           for replica in self._replicas))
+        self._latencies.update(zip(self._replicas, latencies))
+
+    async def start(self, interval: float) -> None:
+        """Checks the replicas and keeps checking them in the background.
+
+        Args:
+            interval (float): time in seconds between the health checks.
+        """
+        if not self._replicas:
+            return
+        await self.check(timeout=interval)
+        self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stops the health checks and closes connections of the replicas"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self._replicas:
+            await replica.dispose()
+
+    async def _run(self, interval: float) -> None:
+        """Checks the replicas periodically"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check(timeout=interval)
+
+    async def _measure(self, replica: AsyncEngine, timeout: float) -> float:
+        """Returns the latency of the replica in seconds or infinity if it is unavailable"""
+        started = time.perf_counter()
+        try:
+            async with replica.connect() as connection:
+                await asyncio.wait_for(connection.execute(text('SELECT 1')), timeout)
+        except (OSError, SQLAlchemyError, asyncio.TimeoutError) as exc:
+            if self._latencies[replica] != math.inf:
+                logger.warning("Replica %s is unavailable: %s", replica.url, exc)
+            return math.inf
+        return time.perf_counter() - started
 
 
 # an Engine, which the Session will use for connection
-engine = create_async_engine(app_settings.database_dsn.unicode_string(), echo=True, future=True)
+engine = build_engine(app_settings.database_dsn.unicode_string())
+# read-only sessions are bound to one of the replicas, if they are configured
+replica_router = ReplicaRouter(
+    engine, [build_engine(dsn.unicode_string()) for dsn in app_settings.database_replica_dsns],
+    selection=app_settings.database_replica_selection)
 # generate Session object
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -14,10 +189,49 @@ async_session = sessionmaker(
 
 
 async def get_session() -> AsyncSession:
-    """Required for Dependency injection.
+    """Required for Dependency injection. Sessions check a connection out of the pool on their
+    first statement only, and FastAPI caches dependencies per request, so all dependencies of a
+    request share one session and requests served from caches do not use the pool at all.
 
     Returns:
         session (AsyncSession): new Session object.
     """
     async with async_session() as session:
         yield session
+
+
+async def get_read_session() -> AsyncSession:
+    """Required for Dependency injection of sessions which only read committed data and
+    tolerate replication lag.
+
+    Returns:
+        session (AsyncSession): new Session object bound to a replica or to the primary.
+    """
+    async with async_session(bind=replica_router.choose()) as session:
+        yield session
+
+
+async def release(*sessions: AsyncSession) -> None:
+    """Ends the transactions of the sessions, which returns their connections to the pools
+    before the request is finished. Loaded rows stay usable, as sessions do not expire them on
+    commit, and the next statement of a session checks a connection out again.
+
+    Args:
+        *sessions (AsyncSession): sessions whose reads are finished.
+    """
+    for session in sessions:
+        if session.in_transaction():
+            await session.commit()
+
+
+async def warm_up_pool(connections: int) -> None:
+    """Opens connections of the primary and the available replicas concurrently and returns
+    them to the pools, so the first requests do not pay the connection setup cost.
+
+    Args:
+        connections (int): number of connections per engine, at most the pool size is kept.
+    """
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(*(stack.enter_async_context(bind.connect())
+                               for bind in [engine, *replica_router.available]
+                               for _ in range(connections)))
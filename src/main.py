@@ -1,10 +1,45 @@
 """Application entrypoint"""
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
 from api.v1.base import api_router
-from api.v1.middleware import check_allowed_ip
+from api.v1.metrics import router as metrics_router
+from api.v1.middleware import BlackListMiddleware, MetricsMiddleware
+from api.v1.redirect import router as redirect_router
 from core.config import app_settings
+from core.ip_filter import black_list
+from core.metrics import registry
+from db.db import async_session, engine, replica_router, warm_up_pool
+from services.short_code_services import short_url_provider
+from services.rate_limiter import rate_limiter
+from services.short_url_services import invalidation_listener, short_url_crud
+from services.usage_recorder import usage_recorder
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Starts and stops application background services"""
+    async with async_session() as session:
+        await short_url_crud.check_fingerprint_mode(database=session)
+    await black_list.start()
+    await replica_router.start(app_settings.database_replica_check_interval)
+    await warm_up_pool(app_settings.database_pool_warm_up)
+    await invalidation_listener.start(app_settings.database_dsn.unicode_string())
+    await usage_recorder.start(async_session)
+    await registry.start(app_settings.metrics_directory, app_settings.metrics_flush_interval)
+    yield
+    await registry.stop()
+    await usage_recorder.stop()
+    await invalidation_listener.stop()
+    await short_url_crud.close()
+    await short_url_provider.close()
+    await rate_limiter.close()
+    await replica_router.stop()
+    await black_list.stop()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -13,7 +48,14 @@ app = FastAPI(
     openapi_url='/api/openapi.json',
     # replace the standard JSON serializer with a faster version written in Rust for optimization
     default_response_class=ORJSONResponse,
-    dependencies=[Depends(check_allowed_ip)],
+    lifespan=lifespan,
 )
 
+# blocked clients are rejected before routing
+app.add_middleware(BlackListMiddleware)
+# added last, so it is the outermost middleware and measures rejected requests as well
+app.add_middleware(MetricsMiddleware)
 app.include_router(api_router, prefix='/api/v1')
+app.include_router(metrics_router, tags=['metrics'])
+# short URLs are served at the root, so they stay as short as possible
+app.include_router(redirect_router, tags=['redirect'])
@@ -0,0 +1,85 @@
+"""Maintenance commands to be run periodically, e.g. by cron.
+
+Usage:
+    python maintenance.py reconcile-counters
+    python maintenance.py manage-partitions
+    python maintenance.py rebuild-fingerprints
+"""
+import argparse
+import asyncio
+from datetime import timedelta
+
+from core.config import app_settings
+from core.logger import get_logger
+from db.db import async_session, engine
+from services.short_url_services import short_url_crud
+from services.usage_services import usage_crud
+
+
+logger = get_logger(__name__)
+
+# number of original URLs fingerprinted at once
+FINGERPRINT_BATCH_SIZE = 10000
+
+
+async def reconcile_counters() -> None:
+    """Repairs click counters which have drifted from the number of stored usages"""
+    async with async_session() as session:
+        repaired = await usage_crud.reconcile_counters(database=session)
+    logger.info("Repaired %s click counters", repaired)
+
+
+async def manage_partitions() -> None:
+    """Creates future usage partitions and expires the ones past the retention period"""
+    async with async_session() as session:
+        created = await usage_crud.create_partitions(
+            database=session, interval=app_settings.usage_partition_interval,
+            ahead=app_settings.usage_partitions_ahead)
+        logger.info("Created usage partitions: %s", created)
+        if app_settings.usage_retention_days > 0:
+            expired = await usage_crud.expire_partitions(
+                database=session, retention=timedelta(days=app_settings.usage_retention_days),
+                action=app_settings.usage_retention_action)
+            logger.info("Expired usage partitions (%s): %s", app_settings.usage_retention_action,
+                        expired)
+
+
+async def rebuild_fingerprints() -> None:
+    """Recomputes fingerprints of original URLs after CANONICALIZE_URLS has been changed, which
+    has to be done while the application is stopped
+    """
+    async with async_session() as session:
+        updated = await short_url_crud.rebuild_fingerprints(database=session,
+                                                            batch_size=FINGERPRINT_BATCH_SIZE)
+    logger.info("Rebuilt fingerprints of %s original URLs", updated)
+
+
+COMMANDS = {
+    'reconcile-counters': reconcile_counters,
+    'manage-partitions': manage_partitions,
+    'rebuild-fingerprints': rebuild_fingerprints,
+}
+
+
+async def run(command: str) -> None:
+    """Runs the command and releases database connections.
+
+    Args:
+        command (str): name of the command.
+    """
+    try:
+        await COMMANDS[command]()
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    """Parses command line arguments and runs the command"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=COMMANDS)
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,12 @@
 """Collects all models in one place"""
 __all__ = [
+    "AppMetadata",
     "Base",
     "ShortURLs",
+    "UsageRollups",
     "Usages",
+    "short_code_blocks",
 ]
 
 from .base import Base
-from .models import ShortURLs, Usages
+from .models import AppMetadata, ShortURLs, UsageRollups, Usages, short_code_blocks
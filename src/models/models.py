@@ -1,27 +1,71 @@
 """Database models"""
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (DDL, BigInteger, Boolean, Column, DateTime, ForeignKey, Index, Integer,
+                        LargeBinary, Sequence, String, event)
 from sqlalchemy_utils import URLType
 
 from models.base import Base
 
 
 class Usages(Base):
-    """Model of the 'usages' table"""
+    """Model of the 'usages' table partitioned by ranges of usage_datetime. Partitions are
+    created and expired by `python maintenance.py manage-partitions`, usages outside of them
+    are kept in the default partition.
+    """
     __tablename__ = 'usages'
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     url_id = Column(Integer, ForeignKey('short_urls.id'))
-    usage_datetime = Column(DateTime, index=True, default=datetime.utcnow)
+    # the partition key has to be a part of the primary key
+    usage_datetime = Column(DateTime, primary_key=True, index=True, default=datetime.utcnow)
     client_host = Column(String, nullable=False)
     client_port = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        # serves ordered listing of the usages of a URL with cursor pagination
+        Index('ix_usages_url_id_usage_datetime_id', 'url_id', 'usage_datetime', 'id'),
+        {'postgresql_partition_by': 'RANGE (usage_datetime)'},
+    )
+
+
+event.listen(Usages.__table__, 'after_create',
+             DDL('CREATE TABLE usages_default PARTITION OF usages DEFAULT'))
+
+
+class UsageRollups(Base):
+    """Model of the 'usage_rollups' table with numbers of usages per time bucket"""
+    __tablename__ = 'usage_rollups'
+    url_id = Column(Integer, ForeignKey('short_urls.id'), primary_key=True)
+    # 'minute', 'hour' or 'day'
+    granularity = Column(String(6), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    clicks = Column(BigInteger, nullable=False)
+
 
 class ShortURLs(Base):
     """Model of the 'short_urls' table"""
     __tablename__ = 'short_urls'
     id = Column(Integer, primary_key=True)
-    initial_url = Column(URLType, nullable=False, unique=True)
+    initial_url = Column(URLType, nullable=False)
+    # 128-bit hash of the normalized original URL, which is indexed instead of the URL itself
+    url_fingerprint = Column(LargeBinary(16), nullable=False, unique=True)
     short_url = Column(URLType, nullable=False, unique=True)
+    # number encoded by the short code of the local providers, redirects are looked up by it
+    code_key = Column(BigInteger, unique=True)
     created_at = Column(DateTime, index=True, default=datetime.utcnow)
     active = Column(Boolean, default=True)
+    # number of usages maintained by the usage writer
+    click_count = Column(BigInteger, nullable=False, default=0, server_default='0')
+
+
+class AppMetadata(Base):
+    """Model of the 'app_metadata' table with settings the stored data was built with, which
+    the application checks at startup
+    """
+    __tablename__ = 'app_metadata'
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+
+
+# every value of the sequence leases a block of short code numbers to an application worker
+short_code_blocks = Sequence('short_code_blocks', metadata=Base.metadata)
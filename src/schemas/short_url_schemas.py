@@ -1,4 +1,6 @@
 """Request and response validation schemes for the ShortURLs model"""
+from typing import List, Optional
+
 from pydantic import BaseModel
 
 
@@ -31,3 +33,45 @@ class ShortURL(ShortURLBase):
     """
     id: int
     short_url: str
+
+
+class ShortURLBulkResult(ShortURL):
+    """Validation scheme for a result of bulk short URL creation returned to a client.
+
+    Args:
+        id (int): unique identifier of the record in the database;
+        initial_url (str): original URL;
+        short_url (str): short URL;
+        status (int): 201 if the short URL has been created, 200 if it already existed and
+            410 if it has been marked as deleted.
+    """
+    status: int
+
+
+class ShortURLResolveRequest(BaseModel):
+    """Validation scheme for a batch of short URLs to be resolved.
+
+    Args:
+        ids (List[int]): unique identifiers of the records in the database;
+        codes (List[str]): short codes;
+        record_usage (bool): whether to record a usage of every resolved short URL.
+    """
+    ids: List[int] = []
+    codes: List[str] = []
+    record_usage: bool = False
+
+
+class ShortURLResolved(BaseModel):
+    """Validation scheme for a resolved short URL returned to a client.
+
+    Args:
+        id (Optional[int]): unique identifier of the record in the database;
+        initial_url (Optional[str]): original URL, None if the short URL does not exist;
+        short_url (Optional[str]): short URL;
+        status (int): 200 if the short URL exists, 404 if it does not exist and 410 if it
+            has been marked as deleted.
+    """
+    id: Optional[int] = None
+    initial_url: Optional[str] = None
+    short_url: Optional[str] = None
+    status: int
@@ -1,7 +1,8 @@
 """Request and response validation schemes for the Usages model"""
 from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class UsageBase(BaseModel):
@@ -30,7 +31,31 @@ class Usage(UsageBase):
         client_host (str): host of the client making the request;
         client_port (int): client port.
     """
+    model_config = ConfigDict(from_attributes=True)
+
     url_id: int
     usage_datetime: datetime
     client_host: str
     client_port: int
+
+
+class UsageBucket(BaseModel):
+    """Validation scheme for number of usages in a time bucket returned to a client.
+
+    Args:
+        bucket (datetime): start of the time bucket;
+        clicks (int): number of requests made within the bucket.
+    """
+    bucket: datetime
+    clicks: int
+
+
+class UsagePage(BaseModel):
+    """Validation scheme for a page of usages returned to a client in cursor pagination.
+
+    Args:
+        items (List[Usage]): usages ordered by date and time;
+        next_cursor (Optional[str]): cursor of the next page or None for the last page.
+    """
+    items: List[Usage]
+    next_cursor: Optional[str]
@@ -0,0 +1,103 @@
+"""Contains an allocator that leases blocks of numbers from a database sequence"""
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from sqlalchemy import Sequence
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class BlockAllocator:
+    """Hands out unique numbers from blocks leased from a database sequence. Every value of the
+    sequence reserves `block_size` consecutive numbers for the current worker, so most of the
+    allocations are served from memory. When the current block runs low, the next one is
+    leased in the background.
+    """
+    def __init__(self, sequence: Sequence, block_size: int, refill_threshold: float):
+        self._sequence = sequence
+        self._block_size = block_size
+        self._refill_level = int(block_size * refill_threshold)
+        # half-open ranges [start, end) of the leased numbers which have not been handed out yet
+        self._blocks: Deque[List[int]] = deque()
+        self._lock = asyncio.Lock()
+        self._refill_task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> int:
+        """Number of leased numbers which have not been handed out yet"""
+        return sum(end - start for start, end in self._blocks)
+
+    async def allocate(self, database: AsyncSession) -> int:
+        """Returns the next unique number.
+
+        Args:
+            database (AsyncSession): database session, which engine is used to lease blocks.
+
+        Returns:
+            int: unique number.
+        """
+        if not self._blocks:
+            async with self._lock:
+                if not self._blocks:
+                    self._blocks.append(await self._lease(database.bind))
+        block = self._blocks[0]
+        number = block[0]
+        block[0] += 1
+        if block[0] == block[1]:
+            self._blocks.popleft()
+        if self.available <= self._refill_level and self._refill_task is None:
+            self._refill_task = asyncio.create_task(self._refill(database.bind))
+        return number
+
+    async def close(self) -> List[Tuple[int, int]]:
+        """Stops background refill and reports the numbers which were leased but not used.
+        Such numbers will never be handed out again.
+
+        Returns:
+            List[Tuple[int, int]]: half-open ranges of the leaked numbers.
+        """
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            self._refill_task = None
+        leaked = [(start, end) for start, end in self._blocks]
+        self._blocks.clear()
+        for start, end in leaked:
+            logger.warning("Leaked %s numbers of the block [%s, %s) of sequence %s",
+                           end - start, start, end, self._sequence.name)
+        return leaked
+
+    async def _lease(self, bind: AsyncEngine) -> List[int]:
+        """Leases the next block from the database sequence.
+
+        Args:
+            bind (AsyncEngine): database engine.
+
+        Returns:
+            List[int]: half-open range of the leased numbers.
+        """
+        async with bind.connect() as connection:
+            block_number = await connection.scalar(self._sequence.next_value())
+        start = (block_number - 1) * self._block_size
+        logger.debug("Leased block [%s, %s) of sequence %s", start, start + self._block_size,
+                     self._sequence.name)
+        return [start, start + self._block_size]
+
+    async def _refill(self, bind: AsyncEngine) -> None:
+        """Leases the next block in the background.
+
+        Args:
+            bind (AsyncEngine): database engine.
+        """
+        try:
+            block = await self._lease(bind)
+            async with self._lock:
+                self._blocks.append(block)
+        except Exception as exc:  # the next allocation will lease a block itself
+            logger.error("Background refill of sequence %s failed: %s", self._sequence.name, exc)
+        finally:
+            self._refill_task = None
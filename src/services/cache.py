@@ -0,0 +1,357 @@
+"""Contains caches for database rows and their invalidation"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Set, Tuple,
+                    TypeVar)
+
+import asyncpg
+import orjson
+from sqlalchemy.engine import make_url
+
+from core.config import app_settings
+from core.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+
+KeyT = TypeVar("KeyT", bound=Hashable)
+ValueT = TypeVar("ValueT")
+
+# returned by LRUCache.get when the key is not cached, as None is a valid cached value
+MISSING: Any = object()
+
+
+class LRUCache(Generic[KeyT, ValueT]):
+    """Bounded cache with least-recently-used eviction and per-entry expiration. None values are
+    cached as negative entries with their own, usually shorter, time to live.
+    """
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._entries: "OrderedDict[KeyT, Tuple[float, Optional[ValueT]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: KeyT) -> Optional[ValueT]:
+        """Returns cached value for the key.
+
+        Args:
+            key (KeyT): cache key.
+
+        Returns:
+            Optional[ValueT]: cached value, None for a negative entry or MISSING if the key
+                is not cached or has expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: KeyT, value: Optional[ValueT], ttl: Optional[float] = None) -> None:
+        """Caches value for the key evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (KeyT): cache key;
+            value (Optional[ValueT]): value to be cached, None for a negative entry;
+            ttl (Optional[float], optional): time to live in seconds overriding the one of the
+                cache, if shorter. Defaults to None.
+        """
+        if self._max_size <= 0:
+            return
+        default_ttl = self._ttl if value is not None else self._negative_ttl
+        ttl = default_ttl if ttl is None else min(ttl, default_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: KeyT) -> None:
+        """Removes the key from the cache.
+
+        Args:
+            key (KeyT): cache key.
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries from the cache"""
+        self._entries.clear()
+
+
+class SharedCache:
+    """Agreement which methods will be created to implement a cache shared between workers.
+    Values are JSON-serializable dictionaries, None values are cached as negative entries.
+    """
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get method, returns MISSING if the key is not cached"""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        """Set method"""
+        raise NotImplementedError
+
+    async def set_many(self, values: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Caches several values at once.
+
+        Args:
+            values (Dict[str, Optional[Dict[str, Any]]]): values keyed by cache keys.
+        """
+        for key, value in values.items():
+            await self.set(key, value)
+
+    async def delete(self, *keys: str) -> None:
+        """Delete method"""
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        """Removes the entries kept by the current worker, entries kept by the cache server
+        expire with their time to live
+        """
+
+    async def close(self) -> None:
+        """Releases resources held by the cache"""
+
+
+class MemorySharedCache(SharedCache):
+    """Stand-in for a shared cache which keeps entries in the current process. Consistency
+    between workers relies on the invalidation broadcast only.
+    """
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self._cache: LRUCache[str, Dict[str, Any]] = LRUCache(max_size=max_size, ttl=ttl,
+                                                              negative_ttl=negative_ttl)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        self._cache.set(key, value)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._cache.invalidate(key)
+
+    async def clear(self) -> None:
+        self._cache.clear()
+
+
+class UnixSocketSharedCache(SharedCache):
+    """Client of the cache server started with `python -m services.cache_server`. Requests and
+    responses are orjson-encoded lines. Errors are logged and treated as cache misses, so the
+    application keeps working when the server is unavailable.
+    """
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = await self._request(['get', key])
+        if not response or not response[0]:
+            return MISSING
+        return response[1]
+
+    async def set(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        await self._request(['set', key, value])
+
+    async def set_many(self, values: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        await self._request(['set_many', values])
+
+    async def delete(self, *keys: str) -> None:
+        await self._request(['delete', *keys])
+
+    async def acquire(self, key: str, interval: float, limit: float) -> Optional[float]:
+        """Counts a request of a client by the rate limiter of the server, see
+        `services.rate_limiter.GCRATable.acquire`.
+
+        Args:
+            key (str): client key;
+            interval (float): time in seconds between requests at the sustained rate;
+            limit (float): time in seconds the client may get ahead of the sustained rate.
+
+        Returns:
+            Optional[float]: 0 if the request is allowed, otherwise time in seconds after which
+                it will be, None if the server is unavailable.
+        """
+        response = await self._request(['gcra', key, interval, limit])
+        return response[0] if response else None
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+    async def _request(self, command: List[Any]) -> Optional[List[Any]]:
+        """Sends a command to the cache server.
+
+        Args:
+            command (List[Any]): name of the command followed by its arguments.
+
+        Returns:
+            Optional[List[Any]]: server response or None if the server is unavailable.
+        """
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self._path)
+                self._writer.write(orjson.dumps(command) + b'\n')
+                await self._writer.drain()
+                return orjson.loads(await self._reader.readline())
+            except asyncio.CancelledError:
+                # the response to the interrupted command would be read by the next one
+                await self.close()
+                raise
+            except (OSError, orjson.JSONDecodeError) as exc:
+                logger.warning("Shared cache at %s is unavailable: %s", self._path, exc)
+                await self.close()
+                return None
+
+
+def get_shared_cache(backend: str) -> Optional[SharedCache]:
+    """Returns shared cache by the name of its backend.
+
+    Args:
+        backend (str): 'memory', 'unix' or 'none'.
+
+    Raises:
+        ValueError: if the backend is unknown.
+
+    Returns:
+        Optional[SharedCache]: cache instance or None if the shared cache is disabled.
+    """
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return MemorySharedCache(max_size=app_settings.cache_max_size, ttl=app_settings.cache_ttl,
+                                 negative_ttl=app_settings.cache_negative_ttl)
+    if backend == 'unix':
+        return UnixSocketSharedCache(app_settings.shared_cache_socket)
+    raise ValueError(f'Unknown shared cache backend: {backend}')
+
+
+class InvalidationListener:
+    """Listens to a Postgres notification channel and passes decoded payloads of the
+    notifications to the subscribers. Every worker runs its own listener on a dedicated
+    connection, so an invalidation published by one worker reaches all of them. The connection
+    is checked every `check_interval` seconds and reopened with exponential backoff when it is
+    lost, after which the reset callbacks clear the caches, as notifications sent in the
+    meantime are lost.
+    """
+    def __init__(self, channel: str, check_interval: float = 30, max_backoff: float = 30):
+        self._channel = channel
+        self._check_interval = check_interval
+        self._max_backoff = max_backoff
+        self._subscribers: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+        self._resets: List[Callable[[], Awaitable[None]]] = []
+        self._dsn: Optional[str] = None
+        self._connection: Optional[asyncpg.Connection] = None
+        self._terminated = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """Registers a coroutine function called with every payload.
+
+        Args:
+            callback (Callable[[Dict[str, Any]], Awaitable[None]]): subscriber.
+        """
+        self._subscribers.append(callback)
+
+    def subscribe_reset(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Registers a coroutine function called after the connection has been reopened.
+
+        Args:
+            callback (Callable[[], Awaitable[None]]): subscriber.
+        """
+        self._resets.append(callback)
+
+    async def start(self, dsn: str) -> None:
+        """Opens a dedicated connection and starts listening.
+
+        Args:
+            dsn (str): SQLAlchemy database URL.
+        """
+        self._dsn = make_url(dsn).set(drivername='postgresql').render_as_string(
+            hide_password=False)
+        await self._connect()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Listening to cache invalidations on channel %s", self._channel)
+
+    async def stop(self) -> None:
+        """Stops listening and closes the connection"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+
+    async def _connect(self) -> None:
+        """Opens the connection and listens to the channel"""
+        self._terminated.clear()
+        connection = await asyncpg.connect(self._dsn)
+        connection.add_termination_listener(self._on_termination)
+        await connection.add_listener(self._channel, self._on_notification)
+        self._connection = connection
+
+    async def _run(self) -> None:
+        """Checks the connection periodically and reopens it when it is lost"""
+        while True:
+            try:
+                await asyncio.wait_for(self._terminated.wait(), self._check_interval)
+            except asyncio.TimeoutError:
+                try:
+                    await asyncio.wait_for(self._connection.execute('SELECT 1'),
+                                           self._check_interval)
+                    continue
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError,
+                        asyncio.TimeoutError) as exc:
+                    logger.warning("Cache invalidation connection failed the check: %s", exc)
+            await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        """Reopens the connection with exponential backoff and calls the reset callbacks"""
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.terminate()
+        delay = min(0.1, self._max_backoff)
+        while True:
+            try:
+                await self._connect()
+                break
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+                logger.warning("Failed to reconnect to cache invalidations, retrying in %.1f s: "
+                               "%s", delay, exc)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_backoff)
+        logger.info("Reconnected to cache invalidations on channel %s", self._channel)
+        for callback in self._resets:
+            await callback()
+
+    def _on_termination(self, connection: asyncpg.Connection) -> None:
+        if connection is self._connection:
+            logger.warning("Cache invalidation connection has been closed")
+            self._terminated.set()
+
+    def _on_notification(self, _connection: asyncpg.Connection, _pid: int, _channel: str,
+                         payload: str) -> None:
+        try:
+            data = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            logger.error("Malformed cache invalidation payload: %s", payload)
+            return
+        for callback in self._subscribers:
+            task = asyncio.create_task(callback(data))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,110 @@
+"""Shared cache server for the application workers listening on a Unix socket.
+
+Usage:
+    python -m services.cache_server /tmp/url_shortener_cache.sock
+"""
+import argparse
+import asyncio
+import os
+from typing import Any, Dict, List
+
+import orjson
+
+from core.logger import get_logger
+from services.cache import MISSING, LRUCache
+from services.rate_limiter import GCRATable
+
+
+logger = get_logger(__name__)
+
+
+class CacheServer:
+    """Serves get, set, set_many and delete commands of the cache and gcra commands of the
+    rate limiter sent as orjson-encoded lines
+    """
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float, max_clients: int = 100000):
+        self._cache: LRUCache[str, Dict[str, Any]] = LRUCache(max_size=max_size, ttl=ttl,
+                                                              negative_ttl=negative_ttl)
+        self._rate_limits = GCRATable(max_size=max_clients)
+
+    def execute(self, command: List[Any]) -> List[Any]:
+        """Executes a single command.
+
+        Args:
+            command (List[Any]): name of the command followed by its arguments.
+
+        Returns:
+            List[Any]: response, [found, value] for the get command, [retry_after] for the gcra
+                command and [True] for the others.
+        """
+        name, *args = command
+        if name == 'gcra':
+            return [self._rate_limits.acquire(args[0], args[1], args[2])]
+        if name == 'get':
+            value = self._cache.get(args[0])
+            return [False, None] if value is MISSING else [True, value]
+        if name == 'set':
+            self._cache.set(args[0], args[1])
+        elif name == 'set_many':
+            for key, value in args[0].items():
+                self._cache.set(key, value)
+        elif name == 'delete':
+            for key in args:
+                self._cache.invalidate(key)
+        else:
+            raise ValueError(f'Unknown command: {name}')
+        return [True]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serves commands of a single client connection.
+
+        Args:
+            reader (asyncio.StreamReader): connection reader;
+            writer (asyncio.StreamWriter): connection writer.
+        """
+        try:
+            while line := await reader.readline():
+                try:
+                    response = self.execute(orjson.loads(line))
+                except (ValueError, IndexError) as exc:
+                    logger.error("Malformed cache command %r: %s", line, exc)
+                    break
+                writer.write(orjson.dumps(response) + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(path: str, server: CacheServer) -> None:
+    """Starts the server and serves clients forever.
+
+    Args:
+        path (str): path of the Unix socket;
+        server (CacheServer): cache server instance.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    unix_server = await asyncio.start_unix_server(server.handle, path=path)
+    logger.info("Shared cache is listening on %s", path)
+    async with unix_server:
+        await unix_server.serve_forever()
+
+
+def main() -> None:
+    """Parses command line arguments and runs the server"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='path of the Unix socket')
+    parser.add_argument('--max-size', type=int, default=100000)
+    parser.add_argument('--ttl', type=float, default=300)
+    parser.add_argument('--negative-ttl', type=float, default=5)
+    parser.add_argument('--max-clients', type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(serve(args.path, CacheServer(max_size=args.max_size, ttl=args.ttl,
+                                             negative_ttl=args.negative_ttl,
+                                             max_clients=args.max_clients)))
+
+
+if __name__ == '__main__':
+    main()
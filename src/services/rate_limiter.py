@@ -0,0 +1,87 @@
+"""Contains the rate limiter of clients implementing the generic cell rate algorithm (GCRA)"""
+from collections import OrderedDict
+import time
+from typing import Optional
+
+from core.config import app_settings
+from services.cache import UnixSocketSharedCache
+
+
+class GCRATable:
+    """Theoretical arrival times (TAT) of the next request of every client. A request is
+    allowed if it does not move the TAT more than `limit` seconds ahead of the current time,
+    every allowed request moves it by `interval` seconds. The table keeps at most `max_size`
+    clients evicting the least recently limited ones, clients whose TAT has passed are dropped,
+    as they are not limited anymore.
+    """
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def acquire(self, key: str, interval: float, limit: float,
+                now: Optional[float] = None) -> float:
+        """Counts a request of the client if it is allowed.
+
+        Args:
+            key (str): client key;
+            interval (float): time in seconds between requests at the sustained rate;
+            limit (float): time in seconds the client may get ahead of the sustained rate,
+                i.e. the burst size multiplied by the interval;
+            now (Optional[float], optional): current monotonic time. Defaults to None, which
+                stands for time.monotonic().
+
+        Returns:
+            float: 0 if the request is allowed, otherwise time in seconds after which it will be.
+        """
+        now = time.monotonic() if now is None else now
+        tat = max(self._tats.get(key, now), now) + interval
+        if tat - now > limit:
+            return tat - now - limit
+        self._tats[key] = tat
+        self._tats.move_to_end(key)
+        while self._tats and (len(self._tats) > self._max_size
+                              or next(iter(self._tats.values())) <= now):
+            self._tats.popitem(last=False)
+        return 0.0
+
+
+class RateLimiter:
+    """Limits requests of clients either in the current worker or, if the cache server is
+    used, across all workers. Limits fall back to the current worker while the cache server
+    is unavailable.
+    """
+    def __init__(self, max_clients: int, shared: Optional[UnixSocketSharedCache] = None):
+        self._table = GCRATable(max_size=max_clients)
+        self._shared = shared
+
+    async def acquire(self, key: str, rate: float, burst: int) -> float:
+        """Counts a request of the client if it is allowed.
+
+        Args:
+            key (str): client key;
+            rate (float): sustained number of requests per second;
+            burst (int): number of requests allowed at once.
+
+        Returns:
+            float: 0 if the request is allowed, otherwise time in seconds after which it will be.
+        """
+        interval = 1 / rate
+        if self._shared is not None:
+            retry_after = await self._shared.acquire(key, interval, burst * interval)
+            if retry_after is not None:
+                return retry_after
+        return self._table.acquire(key, interval, burst * interval)
+
+    async def close(self) -> None:
+        """Closes the connection to the cache server"""
+        if self._shared is not None:
+            await self._shared.close()
+
+
+rate_limiter = RateLimiter(
+    max_clients=app_settings.rate_limit_max_clients,
+    shared=(UnixSocketSharedCache(app_settings.shared_cache_socket)
+            if app_settings.rate_limit_backend == 'unix' else None))
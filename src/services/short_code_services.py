@@ -0,0 +1,255 @@
+"""Contains providers that generate short URLs for original URLs"""
+import hashlib
+import math
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from models.models import short_code_blocks
+from services.block_allocator import BlockAllocator
+
+
+def encode(number: int, alphabet: str, length: int) -> str:
+    """Encodes a non-negative integer as a fixed-width code over the given alphabet.
+
+    Args:
+        number (int): integer to be encoded;
+        alphabet (str): characters used as digits;
+        length (int): length of the resulting code.
+
+    Raises:
+        ValueError: if the number does not fit into a code of the given length.
+
+    Returns:
+        str: encoded number padded with the first character of the alphabet.
+    """
+    if number < 0:
+        raise ValueError('number must be non-negative')
+    base = len(alphabet)
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, base)
+        chars.append(alphabet[remainder])
+    if number:
+        raise ValueError(f'number does not fit into {length} characters')
+    return ''.join(reversed(chars))
+
+
+def decode(code: str, alphabet: str) -> int:
+    """Decodes a code produced by `encode` back to an integer.
+
+    Args:
+        code (str): encoded number;
+        alphabet (str): characters used as digits.
+
+    Raises:
+        ValueError: if the code contains characters outside of the alphabet.
+
+    Returns:
+        int: decoded number.
+    """
+    base = len(alphabet)
+    number = 0
+    for char in code:
+        digit = alphabet.find(char)
+        if digit < 0:
+            raise ValueError(f'character {char!r} is not in the alphabet')
+        number = number * base + digit
+    return number
+
+
+# digits of the configured alphabet, short codes are decoded on every redirect
+CODE_DIGITS = {char: digit for digit, char in enumerate(app_settings.short_code_alphabet)}
+# lookup keys are stored as BIGINT, codes of longer alphabets and lengths may not fit
+MAX_CODE_KEY = 2 ** 63 - 1
+
+
+def to_code_key(code: str) -> Optional[int]:
+    """Returns the number encoded by a short code of the local providers, which is stored as
+    the compact lookup key of the short URL.
+
+    Args:
+        code (str): short code.
+
+    Returns:
+        Optional[int]: decoded number or None if the code could not have been generated by the
+            local providers with the configured alphabet and length or if the number does not
+            fit into a BIGINT column.
+    """
+    if len(code) != app_settings.short_code_length:
+        return None
+    base = len(CODE_DIGITS)
+    number = 0
+    for char in code:
+        digit = CODE_DIGITS.get(char)
+        if digit is None:
+            return None
+        number = number * base + digit
+    return number if number <= MAX_CODE_KEY else None
+
+
+def short_url_code_key(short_url: str) -> Optional[int]:
+    """Returns the compact lookup key of a short URL.
+
+    Args:
+        short_url (str): short URL.
+
+    Returns:
+        Optional[int]: number encoded by the short code or None if the short URL is not served
+            by the application, e.g. it has been created by an external provider.
+    """
+    prefix = build_short_url('')
+    if not short_url.startswith(prefix):
+        return None
+    return to_code_key(short_url[len(prefix):])
+
+
+def build_short_url(code: str) -> str:
+    """Returns short URL served by the application for the short code.
+
+    Args:
+        code (str): short code.
+
+    Returns:
+        str: short URL.
+    """
+    return f'{app_settings.short_url_base.rstrip("/")}/{code}'
+
+
+class ShortURLProvider:
+    """Agreement which methods will be created to implement short URL generation"""
+
+    async def shorten(self, database: AsyncSession, initial_url: str, attempt: int = 0) -> str:
+        """Shorten method"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Releases resources held by the provider"""
+
+
+class SequenceShortURLProvider(ShortURLProvider):
+    """Generates short codes locally from numbers leased in blocks from a database sequence.
+    Numbers are scrambled by a multiplication modulo the code capacity, which is a bijection,
+    so consecutive numbers give unrelated but still unique codes.
+    """
+    def __init__(self, base_url: str, alphabet: str, length: int, secret: str,
+                 allocator: BlockAllocator):
+        self._base_url = base_url.rstrip('/')
+        self._alphabet = alphabet
+        self._length = length
+        self._capacity = len(alphabet) ** length
+        self._allocator = allocator
+        multiplier = int.from_bytes(hashlib.blake2b(secret.encode(), digest_size=8).digest(),
+                                    'big') % self._capacity | 1
+        while math.gcd(multiplier, self._capacity) != 1:
+            multiplier += 2
+        self._multiplier = multiplier
+
+    async def shorten(self, database: AsyncSession, initial_url: str, attempt: int = 0) -> str:
+        """Returns short URL built from the next allocated number. Every call allocates a new
+        number, so a retry after a collision gets a different code.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_url (str): original URL;
+            attempt (int, optional): number of the generation attempt. Defaults to 0.
+
+        Raises:
+            ValueError: if the sequence has exhausted the code capacity.
+
+        Returns:
+            str: short URL.
+        """
+        number = await self._allocator.allocate(database)
+        if number >= self._capacity:
+            raise ValueError('short code capacity is exhausted, increase short code length')
+        code = encode(number * self._multiplier % self._capacity, self._alphabet, self._length)
+        return f'{self._base_url}/{code}'
+
+    async def close(self) -> None:
+        """Reports the leased numbers which have not been used"""
+        await self._allocator.close()
+
+
+class HashShortURLProvider(ShortURLProvider):
+    """Generates short codes locally from a keyed hash of the original URL"""
+    def __init__(self, base_url: str, alphabet: str, length: int, secret: str):
+        self._base_url = base_url.rstrip('/')
+        self._alphabet = alphabet
+        self._length = length
+        self._key = secret.encode()
+        self._capacity = len(alphabet) ** length
+
+    async def shorten(self, database: AsyncSession, initial_url: str, attempt: int = 0) -> str:
+        """Returns short URL for the given original URL. Every attempt gives a different code,
+        so a collision with an existing short URL is resolved by retrying with the next attempt.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_url (str): original URL;
+            attempt (int, optional): number of the generation attempt. Defaults to 0.
+
+        Returns:
+            str: short URL.
+        """
+        digest = hashlib.blake2b(f'{attempt}:{initial_url}'.encode(), key=self._key,
+                                 digest_size=8).digest()
+        number = int.from_bytes(digest, 'big') % self._capacity
+        return f'{self._base_url}/{encode(number, self._alphabet, self._length)}'
+
+
+class TinyURLShortURLProvider(ShortURLProvider):
+
+
+    def __init__(self):
+        # imported here so that the local providers work without pyshorteners
+        from pyshorteners import Shortener
+        self._shortener = Shortener()
+
+    async def shorten(self, database: AsyncSession, initial_url: str, attempt: int = 0) -> str:
+        """Returns short URL for the given original URL. The blocking HTTP call is executed
+        in a thread pool so that it does not stall the event loop.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_url (str): original URL;
+            attempt (int, optional): number of the generation attempt. Defaults to 0.
+
+        Returns:
+            str: short URL.
+        """
+        return await run_in_threadpool(self._shortener.tinyurl.short, initial_url)
+
+
+def get_short_url_provider(name: str) -> ShortURLProvider:
+    """Returns short URL provider by its name.
+
+    Args:
+        name (str): name of the provider.
+
+    Raises:
+        ValueError: if the provider is unknown.
+
+    Returns:
+        ShortURLProvider: provider instance.
+    """
+    if name == 'sequence':
+        return SequenceShortURLProvider(
+            base_url=app_settings.short_url_base, alphabet=app_settings.short_code_alphabet,
+            length=app_settings.short_code_length, secret=app_settings.short_code_secret,
+            allocator=BlockAllocator(sequence=short_code_blocks,
+                                     block_size=app_settings.short_code_block_size,
+                                     refill_threshold=app_settings.short_code_refill_threshold))
+    if name == 'hash':
+        return HashShortURLProvider(base_url=app_settings.short_url_base,
+                                    alphabet=app_settings.short_code_alphabet,
+                                    length=app_settings.short_code_length,
+                                    secret=app_settings.short_code_secret)
+    if name == 'tinyurl':
+        return TinyURLShortURLProvider()
+    raise ValueError(f'Unknown short URL provider: {name}')
+
+
+short_url_provider = get_short_url_provider(app_settings.short_url_provider)
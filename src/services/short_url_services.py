@@ -1,35 +1,179 @@
 """Contains a class that implements validation and work with the database for the ShortURLs model"""
-from typing import Optional
+import asyncio
+from datetime import datetime
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple, Type
+from urllib.parse import urlsplit, urlunsplit
 
+import orjson
+from sqlalchemy import BigInteger, Integer, LargeBinary, Text, any_, bindparam, func, or_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.sql import ColumnElement
 
+from core.config import app_settings
+from core.metrics import cache_lookups
 from services.base import RepositoryDB
-from models.models import ShortURLs as ShortURLsModel
+from services.cache import MISSING, InvalidationListener, LRUCache, SharedCache, get_shared_cache
+from services.short_code_services import (ShortURLProvider, build_short_url, short_url_code_key,
+                                         to_code_key)
+from models.models import AppMetadata as AppMetadataModel, ShortURLs as ShortURLsModel
 from schemas.short_url_schemas import ShortURLCreate
 
 
+class ShortURLGenerationError(Exception):
+    """Raised when a unique short URL could not be generated"""
+
+
+class FingerprintModeError(Exception):
+    """Raised when the stored fingerprints were computed with another normalization of URLs"""
+
+
+# key of the normalization of the stored fingerprints in the app_metadata table
+FINGERPRINT_MODE_KEY = 'url_fingerprint_mode'
+
+
+# ports dropped from canonical URLs
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str) -> str:
+    """Returns canonical form of the URL with lower-case scheme and host, without the default
+    port, with the root path instead of an empty one and with sorted query parameters.
+
+    Args:
+        url (str): URL.
+
+    Returns:
+        str: canonical URL or the URL itself if it cannot be parsed.
+    """
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    if parts.hostname:
+        host = f'[{parts.hostname}]' if ':' in parts.hostname else parts.hostname
+        userinfo = parts.netloc.rpartition('@')[0]
+        netloc = f'{userinfo}@{host}' if userinfo else host
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            netloc = f'{netloc}:{port}'
+    path = parts.path or ('/' if netloc else '')
+    query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    return urlunsplit((scheme, netloc, path, query, parts.fragment))
+
+
+def normalize_url(url: str) -> str:
+    """Returns the form of the URL under which duplicates are detected.
+
+    Args:
+        url (str): original URL.
+
+    Returns:
+        str: canonical URL if canonicalization is enabled, the URL itself otherwise.
+    """
+    return canonicalize_url(url) if app_settings.canonicalize_urls else url
+
+
+def fingerprint_mode() -> str:
+    """Returns the normalization of the original URLs used for their fingerprints.
+
+    Returns:
+        str: 'canonical' if canonicalization is enabled, 'exact' otherwise.
+    """
+    return 'canonical' if app_settings.canonicalize_urls else 'exact'
+
+
+def url_fingerprint(url: str) -> bytes:
+    """Returns 128-bit fingerprint of the normalized original URL, which is indexed instead of
+    the URL itself.
+
+    Args:
+        url (str): original URL.
+
+    Returns:
+        bytes: fingerprint.
+    """
+    return hashlib.blake2b(normalize_url(url).encode(), digest_size=16).digest()
+
+
 class RepositoryShortURL(RepositoryDB[ShortURLsModel, ShortURLCreate]):
-    """Validation and work with the database for the ShortURLs model"""
-    async def read_by_short_url(self, database: AsyncSession,
-                                short_url: str) -> Optional[ShortURLsModel]:
+    """Validation and work with the database for the ShortURLs model. Lookups go through an
+    optional cache shared between workers, deletions are broadcast over a Postgres channel.
+    """
+    def __init__(self, model: Type[ShortURLsModel], cache: Optional[SharedCache] = None,
+                 invalidation_channel: Optional[str] = None):
+        super().__init__(model)
+        self._cache = cache
+        self._invalidation_channel = invalidation_channel
+
+    async def read(self, database: AsyncSession, entity_id: int,
+                   fill_cache: bool = True) -> Optional[ShortURLsModel]:
+        """Returns a database row with specific identifier or None if it does not exist.
+
+        Args:
+            database (AsyncSession): database session;
+            entity_id (int): unique identifier of the row;
+            fill_cache (bool, optional): whether to put the row read from the database into the
+                shared cache, which reads from a lagging replica must not do. Defaults to True.
+
+        Returns:
+            Optional[ShortURLsModel]: database row.
+        """
+        return await self._read_cached(database=database, key=f'id:{entity_id}',
+                                       criterion=self._model.id == entity_id,
+                                       fill_cache=fill_cache)
+
+    async def read_by_short_url(self, database: AsyncSession, short_url: str,
+                                fill_cache: bool = True) -> Optional[ShortURLsModel]:
         """Returns a database row containing specific short URL or None if short URL does not exist.
 
         Args:
             database (AsyncSession): database session;
-            short_url (str): short URL.
+            short_url (str): short URL;
+            fill_cache (bool, optional): whether to put the row read from the database into the
+                shared cache. Defaults to True.
 
         Returns:
             Optional[ShortURLsModel]: database row containing data related to the
                 specified short URL.
         """
-        statement = select(self._model).where(self._model.short_url == short_url)
-        results = await database.execute(statement=statement)
-        return results.scalar_one_or_none()
+        return await self._read_cached(database=database, key=f'short_url:{short_url}',
+                                       criterion=self._model.short_url == short_url,
+                                       fill_cache=fill_cache)
+
+    async def read_by_code(self, database: AsyncSession, code: str,
+                           fill_cache: bool = True) -> Optional[ShortURLsModel]:
+        """Returns a database row containing the short URL with specific short code or None if
+        it does not exist. Codes of the local providers are decoded to the compact lookup key,
+        the others are looked up by the short URL.
+
+        Args:
+            database (AsyncSession): database session;
+            code (str): short code;
+            fill_cache (bool, optional): whether to put the row read from the database into the
+                shared cache. Defaults to True.
+
+        Returns:
+            Optional[ShortURLsModel]: database row containing data related to the
+                specified short code.
+        """
+        code_key = to_code_key(code)
+        if code_key is None:
+            return await self.read_by_short_url(database=database, short_url=build_short_url(code),
+                                                fill_cache=fill_cache)
+        return await self._read_cached(database=database, key=f'code_key:{code_key}',
+                                       criterion=self._model.code_key == code_key,
+                                       fill_cache=fill_cache)
 
     async def read_by_initial_url(self, database: AsyncSession,
                                   initial_url: str) -> Optional[ShortURLsModel]:
         """Returns a database row containing specific original URL or None if it does not exist.
+        The row is found by the fingerprint of the URL and confirmed against the URL itself.
+        Missing original URLs are not cached, as they are about to be created.
 
         Args:
             database (AsyncSession): database session;
@@ -39,9 +183,419 @@ class RepositoryShortURL(RepositoryDB[ShortURLsModel, ShortURLCreate]):
             Optional[ShortURLsModel]: database row containing data related to the
                 specified original URL.
         """
-        statement = select(self._model).where(self._model.initial_url == initial_url)
+        fingerprint = url_fingerprint(initial_url)
+        short_url_db = await self._read_cached(
+            database=database, key=f'fingerprint:{fingerprint.hex()}',
+            criterion=self._model.url_fingerprint == fingerprint, cache_missing=False)
+        if short_url_db is None or not self._matches(short_url_db, initial_url):
+            return None
+        return short_url_db
+
+    async def read_many(self, database: AsyncSession, entity_ids: List[int],
+                        short_urls: List[str]) -> List[ShortURLsModel]:
+        """Returns database rows with any of the identifiers or short URLs with a single query
+        and puts them into the shared cache. Short URLs served by the application are looked up
+        by their compact keys.
+
+        Args:
+            database (AsyncSession): database session;
+            entity_ids (List[int]): unique identifiers of the rows;
+            short_urls (List[str]): short URLs.
+
+        Returns:
+            List[ShortURLsModel]: existing database rows.
+        """
+        code_keys = {short_url: short_url_code_key(short_url) for short_url in short_urls}
+        statement = select(self._model).where(or_(
+            self._model.id == any_(bindparam('entity_ids', entity_ids, type_=ARRAY(Integer))),
+            self._model.code_key == any_(bindparam(
+                'code_keys', [key for key in code_keys.values() if key is not None],
+                type_=ARRAY(BigInteger))),
+            self._model.short_url == any_(bindparam(
+                'short_urls', [short_url for short_url, key in code_keys.items() if key is None],
+                type_=ARRAY(Text)))))
         results = await database.execute(statement=statement)
-        return results.scalar_one_or_none()
+        short_urls_db = results.scalars().all()
+        await self._cache_rows(short_urls_db)
+        return short_urls_db
+
+    async def read_many_by_initial_url(self, database: AsyncSession,
+                                       initial_urls: List[str]) -> Dict[str, ShortURLsModel]:
+        """Returns database rows containing any of the original URLs with a single query by
+        their fingerprints.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_urls (List[str]): original URLs.
+
+        Returns:
+            Dict[str, ShortURLsModel]: database rows of the existing original URLs keyed by them.
+        """
+        fingerprints = {initial_url: url_fingerprint(initial_url) for initial_url in initial_urls}
+        statement = select(self._model).where(self._model.url_fingerprint == any_(
+            bindparam('fingerprints', list(set(fingerprints.values())),
+                      type_=ARRAY(LargeBinary))))
+        results = await database.execute(statement=statement)
+        by_fingerprint = {short_url_db.url_fingerprint: short_url_db
+                          for short_url_db in results.scalars()}
+        short_urls_db = {}
+        for initial_url, fingerprint in fingerprints.items():
+            short_url_db = by_fingerprint.get(fingerprint)
+            if short_url_db is not None and self._matches(short_url_db, initial_url):
+                short_urls_db[initial_url] = short_url_db
+        return short_urls_db
+
+    async def create_many(self, database: AsyncSession, initial_urls: List[str],
+                          provider: ShortURLProvider, max_attempts: int,
+                          concurrency: int = 1) -> Dict[str, Tuple[ShortURLsModel, bool]]:
+        """Returns database rows for all the original URLs creating the missing ones. Existing
+        rows are read with a single query and missing rows are inserted with a multi-row
+        INSERT ... ON CONFLICT DO NOTHING ... RETURNING. Rows skipped because of a conflict are
+        either read, if the original URL has been added concurrently, or retried with the next
+        attempt number, if the generated short URL is already taken.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_urls (List[str]): original URLs, duplicates are allowed;
+            provider (ShortURLProvider): short URL provider;
+            max_attempts (int): maximum number of generation attempts;
+            concurrency (int, optional): maximum number of short URLs generated by the provider
+                at once. Defaults to 1.
+
+        Raises:
+            ShortURLGenerationError: if unique short URLs could not be generated for some of
+                the original URLs.
+
+        Returns:
+            Dict[str, Tuple[ShortURLsModel, bool]]: database rows and whether they have been
+                created keyed by original URLs.
+        """
+        initial_urls = list(dict.fromkeys(initial_urls))
+        short_urls_db = {initial_url: (short_url_db, False) for initial_url, short_url_db in
+                         (await self.read_many_by_initial_url(database, initial_urls)).items()}
+        pending = [initial_url for initial_url in initial_urls if initial_url not in short_urls_db]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def shorten(initial_url: str, attempt: int) -> str:
+            async with semaphore:
+                return await provider.shorten(database, initial_url, attempt)
+
+        for attempt in range(max_attempts):
+            if not pending:
+                break
+            short_urls = await asyncio.gather(*(shorten(initial_url, attempt)
+                                                for initial_url in pending))
+            rows = [{'initial_url': initial_url, 'short_url': short_url}
+                    for initial_url, short_url in zip(pending, short_urls)]
+            for row in rows:
+                row['code_key'] = short_url_code_key(row['short_url'])
+                row['url_fingerprint'] = url_fingerprint(row['initial_url'])
+            statement = insert(self._model).on_conflict_do_nothing().returning(self._model)
+            created = (await database.scalars(statement, rows)).all()
+            await database.commit()
+            short_urls_db.update((short_url_db.initial_url, (short_url_db, True))
+                                 for short_url_db in created)
+            pending = [initial_url for initial_url in pending if initial_url not in short_urls_db]
+            if pending:
+                short_urls_db.update(
+                    (initial_url, (short_url_db, False)) for initial_url, short_url_db in
+                    (await self.read_many_by_initial_url(database, pending)).items())
+                pending = [initial_url for initial_url in pending
+                           if initial_url not in short_urls_db]
+        if pending:
+            raise ShortURLGenerationError(
+                f'Could not generate unique short URLs for {len(pending)} original URLs '
+                f'in {max_attempts} attempts')
+        return short_urls_db
+
+    async def upsert(self, database: AsyncSession, initial_url: str, provider: ShortURLProvider,
+                     max_attempts: int) -> Tuple[ShortURLsModel, bool]:
+        """Returns the database row of the original URL creating it if it does not exist. The
+        row is looked up in the shared cache and then by the fingerprint, so repeated creates
+        neither call the provider nor write anything. A new row is created by a single
+        INSERT ... ON CONFLICT DO NOTHING ... RETURNING, so concurrent creates of the same
+        original URL do not race. If nothing is returned, the row is read again, which tells an
+        original URL created concurrently from a taken short URL, retried with the next attempt
+        number.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_url (str): original URL;
+            provider (ShortURLProvider): short URL provider;
+            max_attempts (int): maximum number of generation attempts.
+
+        Raises:
+            ShortURLGenerationError: if all the generated short URLs are already taken or the
+                fingerprint of the original URL collides with another one.
+
+        Returns:
+            Tuple[ShortURLsModel, bool]: database row containing data related to the specified
+                original URL and whether it has been created.
+        """
+        fingerprint = url_fingerprint(initial_url)
+        if self._cache is not None:
+            values = await self._cache.get(f'fingerprint:{fingerprint.hex()}')
+            if values is not MISSING and values is not None:
+                short_url_db = self._from_values(values)
+                if self._matches(short_url_db, initial_url):
+                    return short_url_db, False
+        short_url_db = await self._read_by_fingerprint(database, initial_url, fingerprint)
+        if short_url_db is not None:
+            return short_url_db, False
+        for attempt in range(max_attempts):
+            short_url = await provider.shorten(database, initial_url, attempt)
+            statement = insert(self._model).values(
+                initial_url=initial_url, short_url=short_url,
+                code_key=short_url_code_key(short_url), url_fingerprint=fingerprint,
+            ).on_conflict_do_nothing().returning(self._model)
+            short_url_db = (await database.scalars(statement)).first()
+            await database.commit()
+            if short_url_db is not None:
+                await self._cache_row(short_url_db)
+                return short_url_db, True
+            short_url_db = await self._read_by_fingerprint(database, initial_url, fingerprint)
+            if short_url_db is not None:
+                return short_url_db, False
+        raise ShortURLGenerationError(
+            f'Could not generate a unique short URL in {max_attempts} attempts')
+
+    async def _read_by_fingerprint(self, database: AsyncSession, initial_url: str,
+                                   fingerprint: bytes) -> Optional[ShortURLsModel]:
+        """Reads the row of the original URL from the database bypassing the caches and caches
+        it.
+
+        Args:
+            database (AsyncSession): database session;
+            initial_url (str): original URL;
+            fingerprint (bytes): fingerprint of the original URL.
+
+        Raises:
+            ShortURLGenerationError: if the fingerprint collides with another original URL.
+
+        Returns:
+            Optional[ShortURLsModel]: database row or None if it does not exist.
+        """
+        short_url_db = await database.scalar(
+            select(self._model).where(self._model.url_fingerprint == fingerprint))
+        if short_url_db is None:
+            return None
+        if not self._matches(short_url_db, initial_url):
+            raise ShortURLGenerationError(
+                f'Fingerprint of {initial_url} collides with {short_url_db.initial_url}')
+        await self._cache_row(short_url_db)
+        return short_url_db
+
+    async def delete(self, database: AsyncSession, entity_id: int) -> None:
+        statement = update(self._model).where(self._model.id == entity_id).values(
+            active=False).returning(self._model.short_url, self._model.initial_url)
+        row = (await database.execute(statement=statement)).one_or_none()
+        if row is not None and self._invalidation_channel:
+            # delivered to the listeners only if the transaction commits
+            payload = orjson.dumps({'id': entity_id, 'short_url': row.short_url,
+                                    'initial_url': row.initial_url}).decode()
+            await database.execute(select(func.pg_notify(self._invalidation_channel, payload)))
+        await database.commit()
+        if row is not None:
+            await self.invalidate(entity_id=entity_id, short_url=row.short_url,
+                                  initial_url=row.initial_url)
+
+    async def invalidate(self, entity_id: int, short_url: str, initial_url: str) -> None:
+        """Removes the row from the shared cache.
+
+        Args:
+            entity_id (int): unique identifier of the row;
+            short_url (str): short URL;
+            initial_url (str): original URL.
+        """
+        if self._cache is not None:
+            await self._cache.delete(f'id:{entity_id}', f'short_url:{short_url}',
+                                     f'code_key:{short_url_code_key(short_url)}',
+                                     f'fingerprint:{url_fingerprint(initial_url).hex()}')
+
+    async def clear(self) -> None:
+        """Removes the rows kept in the shared cache by the current worker"""
+        if self._cache is not None:
+            await self._cache.clear()
+
+    async def close(self) -> None:
+        """Releases resources held by the shared cache"""
+        if self._cache is not None:
+            await self._cache.close()
+
+    async def _read_cached(self, database: AsyncSession, key: str, criterion: ColumnElement,
+                           cache_missing: bool = True,
+                           fill_cache: bool = True) -> Optional[ShortURLsModel]:
+        """Returns a row from the shared cache or from the database caching the result.
+
+        Args:
+            database (AsyncSession): database session;
+            key (str): cache key;
+            criterion (ColumnElement): filter selecting the row from the database;
+            cache_missing (bool, optional): whether to cache the absence of the row.
+                Defaults to True;
+            fill_cache (bool, optional): whether to cache the result at all. Defaults to True.
+
+        Returns:
+            Optional[ShortURLsModel]: database row.
+        """
+        if self._cache is not None:
+            values = await self._cache.get(key)
+            if values is not MISSING:
+                return None if values is None else self._from_values(values)
+        statement = select(self._model).where(criterion)
+        results = await database.execute(statement=statement)
+        short_url_db = results.scalar_one_or_none()
+        if not fill_cache:
+            return short_url_db
+        if short_url_db is not None:
+            await self._cache_row(short_url_db)
+        elif self._cache is not None and cache_missing:
+            await self._cache.set(key, None)
+        return short_url_db
+
+    async def _cache_row(self, short_url_db: ShortURLsModel) -> None:
+        """Puts the row into the shared cache under all its lookup keys.
+
+        Args:
+            short_url_db (ShortURLsModel): database row.
+        """
+        await self._cache_rows([short_url_db])
+
+    async def _cache_rows(self, short_urls_db: List[ShortURLsModel]) -> None:
+        """Puts the rows into the shared cache under all their lookup keys at once.
+
+        Args:
+            short_urls_db (List[ShortURLsModel]): database rows.
+        """
+        if self._cache is None or not short_urls_db:
+            return
+        cached = {}
+        for short_url_db in short_urls_db:
+            values = {column.name: getattr(short_url_db, column.name)
+                      for column in self._model.__table__.columns}
+            if values['created_at'] is not None:
+                values['created_at'] = values['created_at'].isoformat()
+            values['url_fingerprint'] = short_url_db.url_fingerprint.hex()
+            cached[f'id:{short_url_db.id}'] = values
+            cached[f'short_url:{short_url_db.short_url}'] = values
+            cached[f'fingerprint:{values["url_fingerprint"]}'] = values
+            if short_url_db.code_key is not None:
+                cached[f'code_key:{short_url_db.code_key}'] = values
+        await self._cache.set_many(cached)
+
+    def _from_values(self, values: Dict[str, Any]) -> ShortURLsModel:
+        """Builds a detached row from cached values.
+
+        Args:
+            values (Dict[str, Any]): cached column values.
+
+        Returns:
+            ShortURLsModel: row which is not attached to any session.
+        """
+        values = dict(values)
+        if values['created_at'] is not None:
+            values['created_at'] = datetime.fromisoformat(values['created_at'])
+        values['url_fingerprint'] = bytes.fromhex(values['url_fingerprint'])
+        return self._model(**values)
+
+    async def check_fingerprint_mode(self, database: AsyncSession) -> None:
+        """Checks that the stored fingerprints were computed with the configured normalization,
+        as lookups of original URLs would miss their rows otherwise. A database without the
+        recorded normalization adopts the configured one.
+
+        Args:
+            database (AsyncSession): database session.
+
+        Raises:
+            FingerprintModeError: if the fingerprints were computed with another normalization.
+        """
+        mode = fingerprint_mode()
+        await database.execute(insert(AppMetadataModel).values(
+            key=FINGERPRINT_MODE_KEY, value=mode).on_conflict_do_nothing())
+        stored = await database.scalar(select(AppMetadataModel.value).where(
+            AppMetadataModel.key == FINGERPRINT_MODE_KEY))
+        await database.commit()
+        if stored != mode:
+            raise FingerprintModeError(
+                f'Fingerprints of original URLs are {stored}, but CANONICALIZE_URLS requires '
+                f'{mode} ones, run `python maintenance.py rebuild-fingerprints`')
+
+    async def rebuild_fingerprints(self, database: AsyncSession, batch_size: int) -> int:
+        """Recomputes fingerprints of all original URLs with the configured normalization and
+        records it. Rows are updated in a single transaction, which fails without changes if
+        original URLs turn out to be duplicates.
+
+        Args:
+            database (AsyncSession): database session;
+            batch_size (int): number of rows read and updated at once.
+
+        Returns:
+            int: number of updated rows.
+        """
+        last_id, updated = 0, 0
+        while True:
+            rows = (await database.execute(
+                select(self._model.id, self._model.initial_url).where(self._model.id > last_id)
+                .order_by(self._model.id).limit(batch_size))).all()
+            if not rows:
+                break
+            await database.execute(update(self._model), [
+                {'id': row_id, 'url_fingerprint': url_fingerprint(initial_url)}
+                for row_id, initial_url in rows])
+            last_id, updated = rows[-1][0], updated + len(rows)
+        statement = insert(AppMetadataModel).values(key=FINGERPRINT_MODE_KEY,
+                                                    value=fingerprint_mode())
+        await database.execute(statement.on_conflict_do_update(
+            index_elements=[AppMetadataModel.key], set_={'value': statement.excluded.value}))
+        await database.commit()
+        return updated
+
+    @staticmethod
+    def _matches(short_url_db: ShortURLsModel, initial_url: str) -> bool:
+        """Confirms that the row found by the fingerprint contains the original URL.
+
+        Args:
+            short_url_db (ShortURLsModel): database row;
+            initial_url (str): original URL.
+
+        Returns:
+            bool: whether the normalized original URLs are equal.
+        """
+        return normalize_url(short_url_db.initial_url) == normalize_url(initial_url)
+
+
+short_url_crud = RepositoryShortURL(
+    ShortURLsModel, cache=get_shared_cache(app_settings.shared_cache_backend),
+    invalidation_channel=app_settings.cache_invalidation_channel)
+# rows of the redirect hot path keyed by their identifiers
+short_url_cache: LRUCache[int, ShortURLsModel] = LRUCache(
+    max_size=app_settings.cache_max_size, ttl=app_settings.cache_ttl,
+    negative_ttl=app_settings.cache_negative_ttl)
+cache_lookups.set_function(lambda: short_url_cache.hits, ('short_url', 'hit'))
+cache_lookups.set_function(lambda: short_url_cache.misses, ('short_url', 'miss'))
+invalidation_listener = InvalidationListener(app_settings.cache_invalidation_channel)
+
+
+async def invalidate_short_url(payload: Dict[str, Any]) -> None:
+    """Removes a short URL deleted by any worker from the caches of the current one.
+
+    Args:
+        payload (Dict[str, Any]): identifier, short URL and original URL of the deleted row.
+    """
+    short_url_cache.invalidate(payload['id'])
+    await short_url_crud.invalidate(entity_id=payload['id'], short_url=payload['short_url'],
+                                    initial_url=payload['initial_url'])
+
+
+invalidation_listener.subscribe(invalidate_short_url)
+
+
+async def reset_short_urls() -> None:
+    """Clears the caches of the current worker, which might keep short URLs deleted while the
+    invalidations were not received
+    """
+    short_url_cache.clear()
+    await short_url_crud.clear()
 
 
-short_url_crud = RepositoryShortURL(ShortURLsModel)
+invalidation_listener.subscribe_reset(reset_short_urls)
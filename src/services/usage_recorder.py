@@ -0,0 +1,315 @@
+"""Contains a pipeline that writes usages to the database in batches"""
+import asyncio
+from datetime import datetime
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import app_settings
+from core.logger import get_logger
+from core.metrics import usage_queue_depth
+from schemas.usage_schemas import UsageCreate
+from services.usage_services import usage_crud
+
+
+logger = get_logger(__name__)
+
+# maximum time in seconds by which replays of the spill file are postponed after failed writes
+MAX_REPLAY_BACKOFF = 60
+
+
+class UsageRecorder:
+    """Buffers usages in a bounded in-memory queue and writes them in multi-row batches from a
+    background task. A batch is written when it reaches `batch_size` usages or `flush_interval`
+    seconds after its first usage. When the queue is full, the overflow policy applies:
+    'block' makes the caller wait for free space, 'drop' discards the usage and 'spill' appends
+    it to a file, which is written to the database once the queue has been drained after a
+    successful write. The spill file is replayed in batches from an offset kept next to it,
+    so it is never loaded or rewritten as a whole, and after a failed write the replay is
+    postponed with an exponential backoff. The spill file is read and written on a separate
+    thread.
+    """
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float,
+                 overflow_policy: str, spill_path: str, stop_timeout: float = 30):
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queue_size)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow_policy = overflow_policy
+        self._spill_path = spill_path
+        self._stop_timeout = stop_timeout
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._replay_backoff = flush_interval
+        self._replay_at = 0.0
+        self.dropped = 0
+        self.spilled = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether usages are accepted by the pipeline"""
+        return self._task is not None
+
+    @property
+    def queue_size(self) -> int:
+        """Number of usages waiting to be written"""
+        return self._queue.qsize()
+
+    async def start(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """Starts the background writer.
+
+        Args:
+            session_factory (Callable[[], AsyncSession]): factory of database sessions.
+        """
+        self._session_factory = session_factory
+        await self._replay_spill()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops accepting usages and writes the buffered ones, waiting for them at most
+        `stop_timeout` seconds
+        """
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        join = asyncio.create_task(self._queue.join())
+        done, _ = await asyncio.wait([join, task], timeout=self._stop_timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if join not in done:
+            logger.error("Usage writer has not written %s usages before stopping",
+                         self._queue.qsize())
+        join.cancel()
+        task.cancel()
+        await self._replay_spill()
+
+    async def record(self, usage: UsageCreate) -> bool:
+        """Puts a usage into the queue.
+
+        Args:
+            usage (UsageCreate): usage to be written.
+
+        Returns:
+            bool: False if the pipeline is not running and the usage has to be written by the
+                caller, True otherwise.
+        """
+        if self._task is None or self._task.done():
+            return False
+        row = {**usage.model_dump(), 'usage_datetime': datetime.utcnow()}
+        if self._overflow_policy == 'block':
+            await self._queue.put(row)
+            return True
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            if self._overflow_policy == 'spill':
+                await self._spill([row])
+            else:
+                self.dropped += 1
+        return True
+
+    async def _run(self) -> None:
+        """Collects batches from the queue and writes them"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                while len(batch) < self._batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                timeout = deadline - loop.time()
+                if len(batch) >= self._batch_size or timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                written = await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if written and self._queue.empty() and loop.time() >= self._replay_at:
+                written = await self._replay_spill()
+            if written:
+                self._replay_backoff = self._flush_interval
+            else:
+                self._replay_at = loop.time() + self._replay_backoff
+                self._replay_backoff = min(self._replay_backoff * 2, MAX_REPLAY_BACKOFF)
+
+    async def _write(self, rows: List[Dict[str, Any]], keep_failed: bool = True) -> bool:
+        """Writes usages to the database, spills or drops them if the write fails.
+
+        Args:
+            rows (List[Dict[str, Any]]): usages to be written;
+            keep_failed (bool, optional): whether to spill or drop the usages if the write
+                fails, replayed usages stay in the spill file instead. Defaults to True.
+
+        Returns:
+            bool: whether the usages have been written.
+        """
+        try:
+            async with self._session_factory() as session:
+                await usage_crud.create_many(database=session, rows=rows)
+            return True
+        except Exception as exc:  # the writer must keep running whatever the error is
+            logger.error("Failed to write %s usages: %s", len(rows), exc)
+            if not keep_failed:
+                return False
+            if self._overflow_policy == 'spill':
+                await self._spill(rows)
+            else:
+                self.dropped += len(rows)
+            return False
+
+    async def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        """Appends usages to the spill file, drops them if the file cannot be written.
+
+        Args:
+            rows (List[Dict[str, Any]]): usages to be spilled.
+        """
+        data = b''.join(orjson.dumps(row) + b'\n' for row in rows)
+        try:
+            await asyncio.to_thread(append_file, self._spill_path, data)
+        except OSError as exc:
+            logger.error("Failed to spill %s usages to %s: %s", len(rows), self._spill_path, exc)
+            self.dropped += len(rows)
+            return
+        self.spilled += len(rows)
+
+    async def _replay_spill(self) -> bool:
+        """Writes usages from the spill file to the database batch by batch, malformed lines,
+        e.g. the last line of a partially written file, are skipped. The file is moved aside
+        first and the offset of the replayed part is saved after every batch, so a failed or
+        interrupted replay resumes where it stopped. The replay yields to the queue once new
+        usages are waiting.
+
+        Returns:
+            bool: False if a batch or the spill file could not be read or written.
+        """
+        if self._session_factory is None:
+            return True
+        replayed = 0
+        try:
+            replay_path = await asyncio.to_thread(take_file, self._spill_path)
+            if replay_path is None:
+                return True
+            offset = await asyncio.to_thread(read_offset, replay_path)
+            while self._task is None or self._queue.empty():
+                lines, next_offset = await asyncio.to_thread(read_lines, replay_path, offset,
+                                                             self._batch_size)
+                if not lines:
+                    await asyncio.to_thread(remove_replay, replay_path)
+                    break
+                rows = self._parse_spilled(lines)
+                if rows and not await self._write(rows, keep_failed=False):
+                    return False
+                offset = next_offset
+                await asyncio.to_thread(write_offset, replay_path, offset)
+                replayed += len(rows)
+        except OSError as exc:
+            logger.error("Failed to replay spilled usages from %s: %s", self._spill_path, exc)
+            return False
+        finally:
+            if replayed:
+                logger.info("Replayed %s spilled usages", replayed)
+        return True
+
+    def _parse_spilled(self, lines: List[bytes]) -> List[Dict[str, Any]]:
+        """Returns usages of the lines of the spill file counting malformed lines as dropped"""
+        rows = []
+        for line in lines:
+            try:
+                row = orjson.loads(line)
+                row['usage_datetime'] = datetime.fromisoformat(row['usage_datetime'])
+            except (ValueError, TypeError, KeyError) as exc:
+                logger.warning("Skipping malformed spilled usage %r: %s", line, exc)
+                self.dropped += 1
+                continue
+            rows.append(row)
+        return rows
+
+
+def append_file(path: str, data: bytes) -> None:
+    """Appends data to the file.
+
+    Args:
+        path (str): path of the file;
+        data (bytes): data to be appended.
+    """
+    with open(path, 'ab') as appended_file:
+        appended_file.write(data)
+
+
+def take_file(path: str) -> Optional[str]:
+    """Moves the spill file aside for a replay, so usages spilled in the meantime go to a new
+    file. A file left by an unfinished replay is taken first.
+
+    Args:
+        path (str): path of the spill file.
+
+    Returns:
+        Optional[str]: path of the file to be replayed or None if there is nothing to replay.
+    """
+    replay_path = f'{path}.replay'
+    if os.path.exists(replay_path):
+        return replay_path
+    if not os.path.exists(path):
+        return None
+    os.replace(path, replay_path)
+    return replay_path
+
+
+def read_lines(path: str, offset: int, limit: int) -> Tuple[List[bytes], int]:
+    """Reads at most `limit` non-empty lines of the file starting at the offset.
+
+    Args:
+        path (str): path of the file;
+        offset (int): offset in bytes of the first line;
+        limit (int): maximum number of lines.
+
+    Returns:
+        Tuple[List[bytes], int]: lines and the offset following the last of them.
+    """
+    lines = []
+    with open(path, 'rb') as read_file:
+        read_file.seek(offset)
+        while len(lines) < limit:
+            line = read_file.readline()
+            if not line:
+                break
+            if line.strip():
+                lines.append(line)
+        return lines, read_file.tell()
+
+
+def read_offset(path: str) -> int:
+    """Returns the saved offset of the replayed part of the file, 0 if there is none"""
+    try:
+        with open(f'{path}.offset', encoding='utf-8') as offset_file:
+            return int(offset_file.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_offset(path: str, offset: int) -> None:
+    """Saves the offset of the replayed part of the file"""
+    with open(f'{path}.offset.tmp', 'w', encoding='utf-8') as offset_file:
+        offset_file.write(str(offset))
+    os.replace(f'{path}.offset.tmp', f'{path}.offset')
+
+
+def remove_replay(path: str) -> None:
+    """Removes the replayed file and its offset"""
+    os.remove(path)
+    if os.path.exists(f'{path}.offset'):
+        os.remove(f'{path}.offset')
+
+
+usage_recorder = UsageRecorder(max_queue_size=app_settings.usage_queue_size,
+                               batch_size=app_settings.usage_batch_size,
+                               flush_interval=app_settings.usage_flush_interval,
+                               overflow_policy=app_settings.usage_overflow_policy,
+                               spill_path=app_settings.usage_spill_path,
+                               stop_timeout=app_settings.usage_stop_timeout)
+usage_queue_depth.set_function(lambda: usage_recorder.queue_size)
@@ -1,19 +1,243 @@
 """Contains a class that implements validation and work with the database for the Usages model"""
-from typing import Dict, List, Union
+from collections import Counter
+from datetime import datetime, timedelta
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
+from sqlalchemy import (BigInteger, Integer, Row, column, func, text, tuple_, union_all, update,
+                        values)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from services.base import RepositoryDB
-from models.models import Usages as UsagesModel
-from schemas.usage_schemas import Usage, UsageCreate
+from models.models import (ShortURLs as ShortURLsModel, UsageRollups as UsageRollupsModel,
+                           Usages as UsagesModel)
+from schemas.usage_schemas import Usage, UsageBucket, UsageCreate
+
+
+# length of the time buckets of usage rollups
+GRANULARITIES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    """Returns the start of the time bucket containing the moment.
+
+    Args:
+        moment (datetime): date and time;
+        granularity (str): 'minute', 'hour' or 'day'.
+
+    Returns:
+        datetime: start of the time bucket.
+    """
+    moment = moment.replace(second=0, microsecond=0)
+    if granularity in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+# bounds of a range partition as returned by pg_get_expr
+PARTITION_BOUNDS = re.compile(r"FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_start(moment: datetime, interval: str) -> datetime:
+    """Returns the start of the usage partition containing the moment.
+
+    Args:
+        moment (datetime): date and time;
+        interval (str): 'day' or 'month'.
+
+    Returns:
+        datetime: start of the partition.
+    """
+    moment = truncate(moment, 'day')
+    return moment.replace(day=1) if interval == 'month' else moment
+
+
+def next_partition_start(start: datetime, interval: str) -> datetime:
+    """Returns the start of the usage partition following the given one.
+
+    Args:
+        start (datetime): start of a partition;
+        interval (str): 'day' or 'month'.
+
+    Returns:
+        datetime: start of the next partition.
+    """
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
 
 
 class RepositoryUsage(RepositoryDB[UsagesModel, UsageCreate]):
     """Validation and work with the database for the Usages model"""
+    async def create_many(self, database: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        """Inserts usages with a single multi-row statement, increments click counters and
+        usage rollups of the URLs in the same transaction.
+
+        Args:
+            database (AsyncSession): database session;
+            rows (List[Dict[str, Any]]): column values of the usages.
+        """
+        now = datetime.utcnow()
+        rows = [{'usage_datetime': now, **row} for row in rows]
+        clicks = Counter(row['url_id'] for row in rows)
+        buckets = Counter((row['url_id'], granularity, truncate(row['usage_datetime'], granularity))
+                          for row in rows for granularity in GRANULARITIES)
+        await database.execute(insert(self._model), rows)
+        # rows are sorted so that concurrent writers lock the buckets in the same order
+        statement = insert(UsageRollupsModel).values([
+            {'url_id': url_id, 'granularity': granularity, 'bucket': bucket, 'clicks': count}
+            for (url_id, granularity, bucket), count in sorted(buckets.items())])
+        await database.execute(statement.on_conflict_do_update(
+            index_elements=[UsageRollupsModel.url_id, UsageRollupsModel.granularity,
+                            UsageRollupsModel.bucket],
+            set_={'clicks': UsageRollupsModel.clicks + statement.excluded.clicks}))
+        increments = values(column('url_id', Integer), column('clicks', BigInteger),
+                            name='increments').data(list(clicks.items()))
+        await database.execute(
+            update(ShortURLsModel).where(ShortURLsModel.id == increments.c.url_id).values(
+                click_count=ShortURLsModel.click_count + increments.c.clicks))
+        await database.commit()
+
+    async def reconcile_counters(self, database: AsyncSession) -> int:
+        """Recounts usages of every URL and repairs click counters which have drifted. Usages
+        older than the oldest remaining partition have expired, so they are counted from the
+        daily rollups, which outlive them.
+
+        Args:
+            database (AsyncSession): database session.
+
+        Returns:
+            int: number of repaired counters.
+        """
+        partitions = await self.get_partitions(database)
+        oldest = min((start for start, _ in partitions.values()), default=None)
+        usage_counts = select(UsagesModel.url_id, func.count().label('clicks'))
+        sources = []
+        if oldest is not None:
+            usage_counts = usage_counts.where(UsagesModel.usage_datetime >= oldest)
+            sources.append(select(UsageRollupsModel.url_id,
+                                  func.sum(UsageRollupsModel.clicks).label('clicks')).where(
+                UsageRollupsModel.granularity == 'day',
+                UsageRollupsModel.bucket < oldest).group_by(UsageRollupsModel.url_id))
+        sources.append(usage_counts.group_by(UsagesModel.url_id))
+        totals = union_all(*sources).subquery()
+        counts = select(ShortURLsModel.id, func.coalesce(func.sum(totals.c.clicks),
+                                                         0).label('clicks')).outerjoin(
+            totals, totals.c.url_id == ShortURLsModel.id).group_by(ShortURLsModel.id).subquery()
+        results = await database.execute(
+            update(ShortURLsModel).where(ShortURLsModel.id == counts.c.id,
+                                         ShortURLsModel.click_count != counts.c.clicks).values(
+                click_count=counts.c.clicks))
+        await database.commit()
+        return results.rowcount
+
+    async def get_partitions(self, database: AsyncSession) -> Dict[str, Tuple[datetime, datetime]]:
+        """Returns range partitions of the usages table.
+
+        Args:
+            database (AsyncSession): database session.
+
+        Returns:
+            Dict[str, Tuple[datetime, datetime]]: inclusive start and exclusive end of every
+                partition keyed by its name, the default partition is omitted.
+        """
+        results = await database.execute(text(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = CAST(:table AS regclass)'),
+            {'table': self._model.__tablename__})
+        partitions = {}
+        for name, bounds in results:
+            match = PARTITION_BOUNDS.fullmatch(bounds)
+            if match:
+                partitions[name] = (datetime.fromisoformat(match[1]),
+                                    datetime.fromisoformat(match[2]))
+        return partitions
+
+    async def create_partitions(self, database: AsyncSession, interval: str, ahead: int,
+                                now: Optional[datetime] = None) -> List[str]:
+        """Creates the missing partitions from the current one to `ahead` partitions in the
+        future. Usages already written to the default partition within the range of a new
+        partition are moved to it before it is attached.
+
+        Args:
+            database (AsyncSession): database session;
+            interval (str): 'day' or 'month';
+            ahead (int): number of future partitions;
+            now (Optional[datetime], optional): current date and time. Defaults to None, which
+                stands for the current UTC time.
+
+        Returns:
+            List[str]: names of the created partitions.
+        """
+        # identifiers are quoted the same way as by `expire_partitions`
+        quote = database.get_bind().dialect.identifier_preparer.quote
+        table = self._model.__tablename__
+        existing = await self.get_partitions(database)
+        start = partition_start(now or datetime.utcnow(), interval)
+        created = []
+        for _ in range(ahead + 1):
+            end = next_partition_start(start, interval)
+            if not any(lower < end and start < upper for lower, upper in existing.values()):
+                name = f'{table}_p{start:%Y%m%d}'
+                await database.execute(text(
+                    f'CREATE TABLE {quote(name)} (LIKE {quote(table)} '
+                    f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+                await database.execute(text(
+                    f'WITH moved AS (DELETE FROM {quote(f"{table}_default")} '
+                    f'WHERE usage_datetime >= :start AND usage_datetime < :end RETURNING *) '
+                    f'INSERT INTO {quote(name)} SELECT * FROM moved'),
+                    {'start': start, 'end': end})
+                await database.execute(text(
+                    f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES "
+                    f"FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{end:%Y-%m-%d %H:%M:%S}')"))
+                created.append(name)
+            start = end
+        await database.commit()
+        return created
+
+    async def expire_partitions(self, database: AsyncSession, retention: timedelta, action: str,
+                                now: Optional[datetime] = None) -> List[str]:
+        """Drops or detaches partitions which only contain usages older than the retention
+        period. Detached partitions are kept as standalone tables, e.g. for archiving.
+
+        Args:
+            database (AsyncSession): database session;
+            retention (timedelta): retention period;
+            action (str): 'drop' or 'detach';
+            now (Optional[datetime], optional): current date and time. Defaults to None, which
+                stands for the current UTC time.
+
+        Returns:
+            List[str]: names of the expired partitions.
+        """
+        cutoff = (now or datetime.utcnow()) - retention
+        quote = database.get_bind().dialect.identifier_preparer.quote
+        expired = []
+        for name, (_, end) in sorted((await self.get_partitions(database)).items()):
+            if end > cutoff:
+                continue
+            if action == 'detach':
+                await database.execute(text(f'ALTER TABLE {quote(self._model.__tablename__)} '
+                                            f'DETACH PARTITION {quote(name)}'))
+            else:
+                await database.execute(text(f'DROP TABLE {quote(name)}'))
+            expired.append(name)
+        await database.commit()
+        return expired
+
     async def get_status(self, database: AsyncSession, url_id: int, full_info: bool,
                          pagination_parameters: Dict[str, int]) -> Union[int, List[Usage]]:
-        """Returns usage status of the requested URL.
+        """Returns usage status of the requested URL. The total number of requests is read from
+        the click counter of the URL.
 
         Args:
             database (AsyncSession): database session;
@@ -30,13 +254,85 @@ class RepositoryUsage(RepositoryDB[UsagesModel, UsageCreate]):
                 otherwise a dictionary with information about date and time of each request and
                 client host and port who completed the request.
         """
-        if full_info:
-            statement = select(self._model).where(self._model.url_id == url_id).offset(
+        if not full_info:
+            statement = select(ShortURLsModel.click_count).where(ShortURLsModel.id == url_id)
+            return (await database.execute(statement=statement)).scalar() or 0
+        statement = select(self._model).where(self._model.url_id == url_id).order_by(
+            self._model.usage_datetime, self._model.id).offset(
                 pagination_parameters['offset']).limit(pagination_parameters['max_result'])
-        else:
-            statement = select(self._model).where(self._model.url_id == url_id)
         results = await database.execute(statement=statement)
-        return results.scalars().all() if full_info else len(results.fetchall())
+        return results.scalars().all()
+
+    async def get_usages_after(self, database: AsyncSession, url_id: int,
+                               after: Optional[Tuple[datetime, int]],
+                               limit: int) -> List[UsagesModel]:
+        """Returns usages of the requested URL ordered by date, time and identifier, which
+        follow the given one. The query is served by the (url_id, usage_datetime, id) index,
+        so the cost of a page does not depend on its position.
+
+        Args:
+            database (AsyncSession): database session;
+            url_id (int): unique identifier of the requested URL;
+            after (Optional[Tuple[datetime, int]]): date, time and identifier of the last usage
+                of the previous page, None for the first page;
+            limit (int): maximum number of usages returned.
+
+        Returns:
+            List[UsagesModel]: usages.
+        """
+        statement = select(self._model).where(self._model.url_id == url_id)
+        if after:
+            statement = statement.where(
+                tuple_(self._model.usage_datetime, self._model.id) > tuple_(*after))
+        statement = statement.order_by(self._model.usage_datetime, self._model.id).limit(limit)
+        results = await database.execute(statement=statement)
+        return results.scalars().all()
+
+    async def get_stats(self, database: AsyncSession, url_id: int, granularity: str,
+                        start: datetime, end: datetime) -> List[UsageBucket]:
+        """Returns numbers of usages of the requested URL per time bucket. Only buckets with
+        usages are returned, so the cost depends on the number of buckets rather than on the
+        number of usages.
+
+        Args:
+            database (AsyncSession): database session;
+            url_id (int): unique identifier of the requested URL;
+            granularity (str): 'minute', 'hour' or 'day';
+            start (datetime): beginning of the time range, the bucket containing it is included;
+            end (datetime): end of the time range.
+
+        Returns:
+            List[UsageBucket]: numbers of usages ordered by time bucket.
+        """
+        statement = select(UsageRollupsModel.bucket, UsageRollupsModel.clicks).where(
+            UsageRollupsModel.url_id == url_id, UsageRollupsModel.granularity == granularity,
+            UsageRollupsModel.bucket >= truncate(start, granularity),
+            UsageRollupsModel.bucket <= end).order_by(UsageRollupsModel.bucket)
+        results = await database.execute(statement=statement)
+        return [UsageBucket(bucket=bucket, clicks=clicks) for bucket, clicks in results]
+
+    async def stream(self, database: AsyncSession, url_id: int,
+                     partition_size: int) -> AsyncIterator[Sequence[Row]]:
+        """Streams all usages of the requested URL through a server-side cursor, so that only a
+        single partition of rows is held in memory.
+
+        Args:
+            database (AsyncSession): database session;
+            url_id (int): unique identifier of the requested URL;
+            partition_size (int): number of rows fetched at once.
+
+        Yields:
+            Sequence[Row]: partitions of rows with URL identifier, date and time of the usage,
+                host and port of the client ordered by date and time.
+        """
+        statement = select(self._model.url_id, self._model.usage_datetime,
+                           self._model.client_host, self._model.client_port).where(
+            self._model.url_id == url_id).order_by(
+                self._model.usage_datetime, self._model.id).execution_options(
+                    yield_per=partition_size)
+        results = await database.stream(statement)
+        async for partition in results.partitions():
+            yield partition
 
 
 usage_crud = RepositoryUsage(UsagesModel)
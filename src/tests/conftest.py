@@ -13,7 +13,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from core.config import app_settings
-from db.db import get_session
+from db.db import get_read_session, get_session
 from main import app
 from models.base import Base
 
@@ -108,3 +108,5 @@ async def override_get_session() -> AsyncSession:
 
 
 app.dependency_overrides[get_session] = override_get_session
+# the test database stands in for the replicas
+app.dependency_overrides[get_read_session] = override_get_session
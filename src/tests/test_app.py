@@ -1,9 +1,32 @@
 """Application tests"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
 from httpx import AsyncClient
 from fastapi import status
+import orjson
 import pytest
+from sqlalchemy import text, update
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
 
+from api.v1 import middleware
+from api.v1.middleware import BlackListMiddleware
+from core.config import RateLimit, app_settings
+from core.ip_filter import IPFilter
 from main import app
+from models.models import ShortURLs
+from schemas.usage_schemas import UsageCreate
+from services.cache import MISSING
+from services.rate_limiter import RateLimiter
+from services.short_code_services import ShortURLProvider, short_url_provider
+from services.short_url_services import (FingerprintModeError, canonicalize_url,
+                                         invalidation_listener, short_url_cache, short_url_crud)
+from services.usage_recorder import usage_recorder
+from services.usage_services import usage_crud
 
 
 pytestmark = pytest.mark.asyncio
@@ -28,6 +51,7 @@ async def test_create_short_url(client: AsyncClient) -> None:
     assert response.status_code == status.HTTP_201_CREATED
     response = response.json()
     assert set(['id', 'initial_url', 'short_url']).issubset(response.keys())
+    assert response['short_url'].startswith(f'{app_settings.short_url_base}/')
 
 
 async def test_get_initial_url(client: AsyncClient) -> None:
@@ -71,3 +95,451 @@ async def test_delete_url(client: AsyncClient) -> None:
     assert response.status_code == status.HTTP_200_OK
     response = await client.delete(app.url_path_for('delete_url', url_id=url_id))
     assert response.status_code == status.HTTP_410_GONE
+
+
+async def test_get_url_cache(client: AsyncClient) -> None:
+    """Test that URL lookups are served from the cache and missing URLs are cached as well"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/cached'})
+    url_id = response.json()['id']
+    await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    hits = short_url_cache.hits
+    response = await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    assert short_url_cache.hits == hits + 1
+    for _ in range(2):
+        response = await client.get(app.url_path_for('get_initial_url', url_id=10 ** 9))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert short_url_cache.hits == hits + 2
+
+
+async def test_replica_reads_cached_briefly(client: AsyncClient,
+                                            monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that rows read from a replica are cached only for the replication lag"""
+    monkeypatch.setattr(app_settings, 'database_replica_max_lag', 0)
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/replica'})
+    url_id = response.json()['id']
+    # the row created on the primary is cached, unlike the one read back from the replica
+    await short_url_crud.invalidate(entity_id=url_id, short_url=response.json()['short_url'],
+                                    initial_url=response.json()['initial_url'])
+    await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    await asyncio.sleep(0.01)
+    assert short_url_cache.get(url_id) is MISSING
+    assert await short_url_crud._cache.get(f'id:{url_id}') is MISSING
+    response = await client.delete(app.url_path_for('delete_url', url_id=url_id))
+    assert response.status_code == status.HTTP_200_OK
+
+
+async def test_cross_worker_invalidation(client: AsyncClient, setup_test_database: URL) -> None:
+    """Test that a deletion made by another worker invalidates the cache of the current one"""
+    await invalidation_listener.start(setup_test_database.render_as_string(hide_password=False))
+    engine = create_async_engine(setup_test_database)
+    try:
+        response = await client.post(app.url_path_for('create_short_url'),
+                                     json={'initial_url': f'{TEST_INITIAL_URL}/invalidated'})
+        url_id = response.json()['id']
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+        async with AsyncSession(engine) as session:
+            await short_url_crud.delete(database=session, entity_id=url_id)
+        for _ in range(100):
+            if short_url_cache.get(url_id) is MISSING:
+                break
+            await asyncio.sleep(0.01)
+        response = await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+        assert response.status_code == status.HTTP_410_GONE
+    finally:
+        await invalidation_listener.stop()
+        await engine.dispose()
+
+
+async def test_invalidation_listener_reconnect(client: AsyncClient,
+                                               setup_test_database: URL) -> None:
+    """Test that the listener reconnects and clears the caches after losing its connection"""
+    await invalidation_listener.start(setup_test_database.render_as_string(hide_password=False))
+    engine = create_async_engine(setup_test_database)
+    try:
+        response = await client.post(app.url_path_for('create_short_url'),
+                                     json={'initial_url': f'{TEST_INITIAL_URL}/reconnected'})
+        url_id = response.json()['id']
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+        assert short_url_cache.get(url_id) is not MISSING
+        pid = invalidation_listener._connection.get_server_pid()
+        async with engine.connect() as connection:
+            await connection.execute(text(f'SELECT pg_terminate_backend({pid})'))
+        for _ in range(100):
+            if short_url_cache.get(url_id) is MISSING:
+                break
+            await asyncio.sleep(0.01)
+        assert short_url_cache.get(url_id) is MISSING
+        assert invalidation_listener._connection.get_server_pid() != pid
+    finally:
+        await invalidation_listener.stop()
+        await engine.dispose()
+
+
+async def test_batched_usages(client: AsyncClient, setup_test_database: URL) -> None:
+    """Test that usages queued by redirects are written when the recorder stops"""
+    engine = create_async_engine(setup_test_database)
+    await usage_recorder.start(sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+    try:
+        response = await client.post(app.url_path_for('create_short_url'),
+                                     json={'initial_url': f'{TEST_INITIAL_URL}/batched'})
+        url_id = response.json()['id']
+        for _ in range(5):
+            response = await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+            assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+    finally:
+        await usage_recorder.stop()
+        await engine.dispose()
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id))
+    assert response.json() == 5
+
+
+async def test_reconcile_counters(client: AsyncClient, setup_test_database: URL) -> None:
+    """Test that reconciliation repairs a drifted click counter"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/reconciled'})
+    url_id = response.json()['id']
+    for _ in range(3):
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id))
+    assert response.json() == 3
+    engine = create_async_engine(setup_test_database)
+    async with AsyncSession(engine) as session:
+        await session.execute(update(ShortURLs).where(ShortURLs.id == url_id).values(
+            click_count=100))
+        await session.commit()
+        assert await usage_crud.reconcile_counters(database=session) >= 1
+        # usages without rollups, e.g. migrated ones without a date, are counted as well
+        await usage_crud.create_many(database=session, rows=[
+            {'url_id': url_id, 'client_host': '127.0.0.1', 'client_port': 80}])
+        await session.execute(text('DELETE FROM usage_rollups WHERE url_id = :url_id'),
+                              {'url_id': url_id})
+        await session.commit()
+        await usage_crud.reconcile_counters(database=session)
+    await engine.dispose()
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id))
+    assert response.json() == 4
+
+
+async def test_get_usage_stats(client: AsyncClient) -> None:
+    """Test GET endpoint for usage statistics per time bucket"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/stats'})
+    url_id = response.json()['id']
+    for _ in range(2):
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    for granularity in ('minute', 'hour', 'day'):
+        response = await client.get(app.url_path_for('get_usage_stats', url_id=url_id),
+                                    params={'granularity': granularity})
+        assert response.status_code == status.HTTP_200_OK
+        assert sum(bucket['clicks'] for bucket in response.json()) == 2
+    response = await client.get(app.url_path_for('get_usage_stats', url_id=url_id),
+                                params={'granularity': 'minute', 'from': '2000-01-01T00:00:00'})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_get_usage_status_cursor(client: AsyncClient) -> None:
+    """Test cursor pagination of detailed usage status"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/cursor'})
+    url_id = response.json()['id']
+    for _ in range(5):
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    usages, cursor = [], ''
+    while cursor is not None:
+        response = await client.get(app.url_path_for('get_usage_status', url_id=url_id),
+                                    params={'full-info': True, 'max-result': 2, 'cursor': cursor})
+        assert response.status_code == status.HTTP_200_OK
+        usages.extend(response.json()['items'])
+        cursor = response.json()['next_cursor']
+    assert len(usages) == 5
+    assert usages == sorted(usages, key=lambda usage: usage['usage_datetime'])
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id),
+                                params={'full-info': True, 'cursor': 'malformed'})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+async def test_export_usages(client: AsyncClient) -> None:
+    """Test streaming export of usages"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/export'})
+    url_id = response.json()['id']
+    for _ in range(3):
+        await client.get(app.url_path_for('get_initial_url', url_id=url_id))
+    response = await client.get(app.url_path_for('export_usages', url_id=url_id))
+    assert response.status_code == status.HTTP_200_OK
+    lines = response.text.splitlines()
+    assert len(lines) == 3
+    assert all(orjson.loads(line)['url_id'] == url_id for line in lines)
+    response = await client.get(app.url_path_for('export_usages', url_id=url_id),
+                                params={'format': 'csv'})
+    assert response.headers['content-type'].startswith('text/csv')
+    lines = response.text.splitlines()
+    assert lines[0] == 'url_id,usage_datetime,client_host,client_port'
+    assert len(lines) == 4
+
+
+async def test_create_short_urls_bulk(client: AsyncClient) -> None:
+    """Test POST endpoint for bulk creation of shortened URLs"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/bulk/deleted'})
+    await client.delete(app.url_path_for('delete_url', url_id=response.json()['id']))
+    initial_urls = [f'{TEST_INITIAL_URL}/bulk/{index}' for index in range(3)]
+    initial_urls += [initial_urls[0], f'{TEST_INITIAL_URL}/bulk/deleted']
+    response = await client.post(app.url_path_for('create_short_urls_bulk'),
+                                 json=[{'initial_url': url} for url in initial_urls])
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [result['initial_url'] for result in results] == initial_urls
+    assert [result['status'] for result in results] == [201, 201, 201, 201, 410]
+    assert results[0]['id'] == results[3]['id']
+    content = '\n'.join(orjson.dumps({'initial_url': url}).decode() for url in initial_urls[:2])
+    response = await client.post(app.url_path_for('create_short_urls_bulk'), content=content,
+                                 headers={'content-type': 'application/x-ndjson'})
+    assert [result['status'] for result in response.json()] == [200, 200]
+    response = await client.post(app.url_path_for('create_short_urls_bulk'), json=[{}])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_create_short_urls_bulk_limits(client: AsyncClient,
+                                             monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that oversized bulk requests are rejected before their items are validated"""
+    monkeypatch.setattr(app_settings, 'bulk_max_size', 2)
+    monkeypatch.setattr(app_settings, 'bulk_max_body_size', 100)
+    response = await client.post(app.url_path_for('create_short_urls_bulk'), json=[{}] * 3)
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    response = await client.post(app.url_path_for('create_short_urls_bulk'), content='{}\n' * 3,
+                                 headers={'content-type': 'application/x-ndjson'})
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    response = await client.post(app.url_path_for('create_short_urls_bulk'),
+                                 json=[{'initial_url': f'{TEST_INITIAL_URL}/{"x" * 100}'}])
+    assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+async def test_resolve_short_urls(client: AsyncClient) -> None:
+    """Test POST endpoint for resolving a batch of short URLs"""
+    response = await client.post(app.url_path_for('create_short_urls_bulk'),
+                                 json=[{'initial_url': f'{TEST_INITIAL_URL}/resolve/{index}'}
+                                       for index in range(2)])
+    created = response.json()
+    await client.delete(app.url_path_for('delete_url', url_id=created[1]['id']))
+    code = created[0]['short_url'].rsplit('/', 1)[1]
+    response = await client.post(app.url_path_for('resolve_short_urls'), json={
+        'ids': [created[0]['id'], created[1]['id'], 10 ** 9], 'codes': [code, 'missing']})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    assert [result['status'] for result in results] == [200, 410, 404, 200, 404]
+    assert results[0]['initial_url'] == results[3]['initial_url'] == created[0]['initial_url']
+    response = await client.get(app.url_path_for('get_usage_status', url_id=created[0]['id']))
+    assert response.json() == 0
+    await client.post(app.url_path_for('resolve_short_urls'),
+                      json={'ids': [created[0]['id']], 'record_usage': True})
+    response = await client.get(app.url_path_for('get_usage_status', url_id=created[0]['id']))
+    assert response.json() == 1
+
+
+async def test_resolve_partially_recorded(client: AsyncClient,
+                                          monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that only the usages which the recorder has not queued are written directly"""
+    response = await client.post(app.url_path_for('create_short_urls_bulk'),
+                                 json=[{'initial_url': f'{TEST_INITIAL_URL}/partial/{index}'}
+                                       for index in range(2)])
+    url_ids = [result['id'] for result in response.json()]
+    queued = []
+
+    async def record(usage: UsageCreate) -> bool:
+        queued.append(usage.url_id)
+        return len(queued) == 1
+
+    monkeypatch.setattr(usage_recorder, 'record', record)
+    await client.post(app.url_path_for('resolve_short_urls'),
+                      json={'ids': url_ids, 'record_usage': True})
+    statuses = [(await client.get(app.url_path_for('get_usage_status', url_id=url_id))).json()
+                for url_id in url_ids]
+    assert statuses == [0, 1]
+
+
+async def test_upsert(setup_test_database: URL) -> None:
+    """Test that taken short URLs are retried and repeated creates write nothing"""
+    class CountingProvider(ShortURLProvider):
+        def __init__(self, short_urls: List[str]):
+            self.short_urls = short_urls
+
+        async def shorten(self, database: AsyncSession, initial_url: str,
+                          attempt: int = 0) -> str:
+            return self.short_urls.pop(0)
+
+    engine = create_async_engine(setup_test_database)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            taken, _ = await short_url_crud.upsert(
+                session, f'{TEST_INITIAL_URL}/upsert/taken',
+                provider=CountingProvider(['http://localhost:8000/upsert1']), max_attempts=1)
+            provider = CountingProvider([taken.short_url, 'http://localhost:8000/upsert2'])
+            short_url_db, created = await short_url_crud.upsert(
+                session, f'{TEST_INITIAL_URL}/upsert', provider=provider, max_attempts=2)
+            assert created and short_url_db.short_url == 'http://localhost:8000/upsert2'
+            await short_url_crud.clear()
+            xmin = await session.scalar(text('SELECT xmin::text FROM short_urls WHERE id = :id'),
+                                        {'id': short_url_db.id})
+            assert await short_url_crud.upsert(session, f'{TEST_INITIAL_URL}/upsert',
+                                               provider=provider, max_attempts=2) == (
+                short_url_db, False)
+            assert await session.scalar(text('SELECT xmin::text FROM short_urls WHERE id = :id'),
+                                        {'id': short_url_db.id}) == xmin
+    finally:
+        await engine.dispose()
+
+
+async def test_create_short_url_concurrently(client: AsyncClient,
+                                             setup_test_database: URL) -> None:
+    """Test concurrent POST requests creating the same shortened URL"""
+    initial_url = f'{TEST_INITIAL_URL}/concurrent'
+    responses = await asyncio.gather(*(
+        client.post(app.url_path_for('create_short_url'), json={'initial_url': initial_url})
+        for _ in range(5)))
+    assert {response.status_code for response in responses} == {status.HTTP_201_CREATED}
+    assert len({response.json()['id'] for response in responses}) == 1
+    engine = create_async_engine(setup_test_database)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        short_url_db, created = await short_url_crud.upsert(
+            database=session, initial_url=initial_url, provider=short_url_provider,
+            max_attempts=1)
+    await engine.dispose()
+    assert created is False
+    assert short_url_db.id == responses[0].json()['id']
+
+
+async def test_manage_partitions(client: AsyncClient, setup_test_database: URL) -> None:
+    """Test creation and expiration of usage partitions"""
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': f'{TEST_INITIAL_URL}/partitioned'})
+    url_id = response.json()['id']
+    moment = datetime(2031, 1, 15, 12)
+    engine = create_async_engine(setup_test_database)
+    async with AsyncSession(engine) as session:
+        await usage_crud.create_many(database=session, rows=[
+            {'url_id': url_id, 'client_host': 'host', 'client_port': 1, 'usage_datetime': moment}])
+        created = await usage_crud.create_partitions(database=session, interval='day', ahead=1,
+                                                     now=moment)
+        assert created == ['usages_p20310115', 'usages_p20310116']
+        assert await usage_crud.create_partitions(database=session, interval='month', ahead=0,
+                                                  now=moment) == []
+        count = await session.execute(text('SELECT count(*) FROM usages_p20310115'))
+        assert count.scalar() == 1
+        expired = await usage_crud.expire_partitions(database=session, retention=timedelta(days=1),
+                                                     action='detach', now=datetime(2031, 1, 17))
+        assert expired == ['usages_p20310115']
+        expired = await usage_crud.expire_partitions(database=session, retention=timedelta(days=1),
+                                                     action='drop', now=datetime(2031, 1, 18))
+        assert expired == ['usages_p20310116']
+        await session.execute(text('DROP TABLE usages_p20310115'))
+        await session.commit()
+    await engine.dispose()
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id))
+    assert response.json() == 1
+
+
+async def test_redirect(client: AsyncClient) -> None:
+    """Test GET endpoint redirecting a short URL to the original one"""
+    initial_url = f'{TEST_INITIAL_URL}/redirected?query=a b'
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': initial_url})
+    url_id, short_url = response.json()['id'], response.json()['short_url']
+    code = short_url.rsplit('/', 1)[1]
+    for _ in range(2):
+        response = await client.get(app.url_path_for('redirect', code=code))
+        assert response.status_code == status.HTTP_307_TEMPORARY_REDIRECT
+        assert response.headers['location'] == initial_url.replace(' ', '%20')
+        assert response.headers['cache-control'] == 'private, max-age=0'
+        assert response.content == b''
+    response = await client.get(app.url_path_for('get_usage_status', url_id=url_id))
+    assert response.json() == 2
+    response = await client.get(app.url_path_for('redirect', code='missing'))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    await client.delete(app.url_path_for('delete_url', url_id=url_id))
+    response = await client.get(app.url_path_for('redirect', code=code))
+    assert response.status_code == status.HTTP_410_GONE
+
+
+async def test_canonical_duplicates(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that canonicalization makes equivalent original URLs share a short URL"""
+    assert canonicalize_url('HTTPS://Example.COM:443?b=2&a=1') == 'https://example.com/?a=1&b=2'
+    assert canonicalize_url('http://[::1]:8080/x') == 'http://[::1]:8080/x'
+    initial_urls = ['https://example.com/canonical?b=2&a=1',
+                    'HTTPS://EXAMPLE.com:443/canonical?a=1&b=2']
+    responses = [await client.post(app.url_path_for('create_short_url'),
+                                   json={'initial_url': initial_url})
+                 for initial_url in initial_urls]
+    assert responses[0].json()['id'] != responses[1].json()['id']
+    monkeypatch.setattr(app_settings, 'canonicalize_urls', True)
+    initial_urls = [f'{initial_url}&c=3' for initial_url in initial_urls]
+    responses = [await client.post(app.url_path_for('create_short_url'),
+                                   json={'initial_url': initial_url})
+                 for initial_url in initial_urls]
+    assert responses[0].json()['id'] == responses[1].json()['id']
+    assert responses[1].json()['initial_url'] == initial_urls[0]
+
+
+async def test_fingerprint_mode(client: AsyncClient, setup_test_database: URL,
+                                monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that fingerprints of another normalization are detected and can be rebuilt"""
+    for initial_url in ('https://example.com/rebuilt', 'HTTPS://EXAMPLE.COM/rebuilt'):
+        await client.post(app.url_path_for('create_short_url'), json={'initial_url': initial_url})
+    engine = create_async_engine(setup_test_database)
+    async with AsyncSession(engine) as session:
+        await short_url_crud.check_fingerprint_mode(database=session)
+        monkeypatch.setattr(app_settings, 'canonicalize_urls', True)
+        with pytest.raises(FingerprintModeError):
+            await short_url_crud.check_fingerprint_mode(database=session)
+        # the original URLs above are duplicates under canonicalization
+        with pytest.raises(IntegrityError):
+            await short_url_crud.rebuild_fingerprints(database=session, batch_size=10)
+        await session.rollback()
+        monkeypatch.setattr(app_settings, 'canonicalize_urls', False)
+        assert await short_url_crud.rebuild_fingerprints(database=session, batch_size=10) >= 2
+        await short_url_crud.check_fingerprint_mode(database=session)
+    await engine.dispose()
+
+
+async def test_black_list_middleware() -> None:
+    """Test that blocked clients are rejected before routing"""
+    blocked_app = BlackListMiddleware(app, ip_filter=IPFilter(['127.0.0.0/8'], path=None,
+                                                              reload_interval=0))
+    async with AsyncClient(app=blocked_app, base_url='http://testserver') as blocked_client:
+        response = await blocked_client.get(app.url_path_for('ping_database'))
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert response.json() == {'detail': 'Forbidden'}
+
+
+async def test_rate_limit(client: AsyncClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that clients exceeding the limit of a group of routes are throttled"""
+    monkeypatch.setattr(app_settings, 'rate_limits',
+                        {'create': RateLimit(rate=0.01, burst=2)})
+    monkeypatch.setattr(middleware, 'rate_limiter', RateLimiter(max_clients=10))
+    statuses = [(await client.post(app.url_path_for('create_short_url'),
+                                   json={'initial_url': TEST_INITIAL_URL})).status_code
+                for _ in range(2)]
+    assert status.HTTP_429_TOO_MANY_REQUESTS not in statuses
+    response = await client.post(app.url_path_for('create_short_url'),
+                                 json={'initial_url': TEST_INITIAL_URL})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers['retry-after']) > 0
+    response = await client.get(app.url_path_for('ping_database'))
+    assert response.status_code == status.HTTP_200_OK
+
+
+async def test_metrics(client: AsyncClient) -> None:
+    """Test that request and cache metrics are exposed"""
+    await client.get(app.url_path_for('ping_database'))
+    response = await client.get(app.url_path_for('get_metrics'))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'].startswith('text/plain')
+    lines = response.text.splitlines()
+    assert any(line.startswith('http_request_duration_seconds_count{method="GET",'
+                               'route="/api/v1/database/ping",status="200"}') for line in lines)
+    assert any(line.startswith('cache_lookups_total{cache="short_url",result="hit"}')
+               for line in lines)
+    assert 'http_requests_in_progress{method="GET"} 1.0' in lines
@@ -0,0 +1,80 @@
+"""Cache tests"""
+import asyncio
+from pathlib import Path
+import time
+
+import orjson
+import pytest
+
+from services.cache import MISSING, LRUCache, UnixSocketSharedCache
+from services.cache_server import CacheServer
+
+
+def test_lru_eviction() -> None:
+    """Test that the least recently used entry is evicted first"""
+    cache = LRUCache(max_size=2, ttl=60, negative_ttl=60)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.set(3, 'c')
+    assert cache.get(2) is MISSING
+    assert cache.get(1) == 'a'
+    assert cache.get(3) == 'c'
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_ttl_and_negative_entries() -> None:
+    """Test that entries expire and None is cached as a negative entry"""
+    cache = LRUCache(max_size=10, ttl=60, negative_ttl=0.01)
+    cache.set(1, None)
+    assert cache.get(1) is None
+    time.sleep(0.02)
+    assert cache.get(1) is MISSING
+    cache.set(2, 'b')
+    cache.invalidate(2)
+    assert cache.get(2) is MISSING
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_shared_cache(tmp_path: Path) -> None:
+    """Test the shared cache client against the Unix socket server"""
+    path = str(tmp_path / 'cache.sock')
+    server = await asyncio.start_unix_server(
+        CacheServer(max_size=10, ttl=60, negative_ttl=60).handle, path=path)
+    cache = UnixSocketSharedCache(path)
+    async with server:
+        assert await cache.get('id:1') is MISSING
+        await cache.set('id:1', {'id': 1, 'active': True})
+        await cache.set('id:2', None)
+        assert await cache.get('id:1') == {'id': 1, 'active': True}
+        assert await cache.get('id:2') is None
+        await cache.delete('id:1', 'id:2')
+        assert await cache.get('id:1') is MISSING
+        await cache.close()
+    assert await UnixSocketSharedCache(str(tmp_path / 'missing.sock')).get('id:1') is MISSING
+
+
+@pytest.mark.asyncio
+async def test_cancelled_shared_cache_request(tmp_path: Path) -> None:
+    """Test that the response to a cancelled command is not read by the next one"""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                await asyncio.sleep(0.05)
+                writer.write(orjson.dumps([True, {'key': orjson.loads(line)[1]}]) + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+
+    path = str(tmp_path / 'cache.sock')
+    server = await asyncio.start_unix_server(handle, path=path)
+    cache = UnixSocketSharedCache(path)
+    async with server:
+        request = asyncio.create_task(cache.get('id:1'))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        assert await cache.get('id:2') == {'key': 'id:2'}
+        await cache.close()
@@ -0,0 +1,67 @@
+"""Database connection tests"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import pytest
+
+from core.metrics import pool_connections, pool_wait, query_duration
+from db.db import ReplicaRouter, build_engine, release
+
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_replica_router(setup_test_database: URL) -> None:
+    """Test choice of replicas for read-only sessions"""
+    primary = create_async_engine(setup_test_database)
+    replicas = [create_async_engine(setup_test_database) for _ in range(2)]
+    router = ReplicaRouter(primary, replicas, selection='round-robin')
+    await router.check(timeout=5)
+    assert [router.choose() for _ in range(4)] == replicas * 2
+    router = ReplicaRouter(primary, replicas, selection='least-latency')
+    await router.check(timeout=5)
+    assert router.choose() in replicas
+    unavailable = create_async_engine(setup_test_database.set(port=1))
+    router = ReplicaRouter(primary, [unavailable, replicas[0]], selection='round-robin')
+    await router.check(timeout=5)
+    assert [router.choose() for _ in range(2)] == [replicas[0]] * 2
+    router = ReplicaRouter(primary, [unavailable], selection='least-latency')
+    await router.check(timeout=5)
+    assert router.choose() is primary
+    await router.stop()
+    for engine in [primary, *replicas]:
+        await engine.dispose()
+
+
+async def test_engine_metrics(setup_test_database: URL) -> None:
+    """Test that statements, waits for connections and usage of the pool are measured"""
+    engine = build_engine(setup_test_database.render_as_string(hide_password=False))
+    database = (f'{setup_test_database.host}:{setup_test_database.port or 5432}/'
+                f'{setup_test_database.database}')
+    async with engine.connect() as connection:
+        await connection.execute(text('SELECT 1'))
+        assert dict(pool_connections.samples())[(database, 'in_use')] == 1
+    samples = dict(query_duration.samples())
+    assert sum(samples[(database, 'SELECT')][:-1]) >= 1
+    assert sum(dict(pool_wait.samples())[(database,)][:-1]) >= 1
+    await engine.dispose()
+    assert dict(pool_connections.samples())[(database, 'in_use')] == 0
+    # the pool logs under this application, but as quietly as the pools of SQLAlchemy
+    assert not engine.pool.logger.isEnabledFor(logging.INFO)
+
+
+async def test_release(setup_test_database: URL) -> None:
+    """Test that released sessions return their connections to the pool"""
+    engine = create_async_engine(setup_test_database)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        assert engine.pool.checkedout() == 0
+        await session.execute(text('SELECT 1'))
+        assert engine.pool.checkedout() == 1
+        await release(session)
+        assert engine.pool.checkedout() == 0
+        await release(session)
+        assert await session.scalar(text('SELECT 2')) == 2
+    assert engine.pool.checkedout() == 0
+    await engine.dispose()
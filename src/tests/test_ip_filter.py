@@ -0,0 +1,44 @@
+"""Black list tests"""
+import asyncio
+import os
+
+import pytest
+
+from core.ip_filter import IPFilter, IPMatcher
+
+
+def test_ip_matcher() -> None:
+    """Test matching of addresses against IPv4 and IPv6 networks"""
+    matcher = IPMatcher(['10.0.0.0/8', '10.1.0.0/16', '11.0.0.0/8', '192.168.1.7', '2001:db8::/32'])
+    assert len(matcher) == 3
+    for address in ('10.0.0.0', '11.255.255.255', '192.168.1.7', '::ffff:10.2.3.4',
+                    '2001:db8::1'):
+        assert address in matcher
+    for address in ('9.255.255.255', '12.0.0.0', '192.168.1.8', '2001:db9::1', 'testclient',
+                    ''):
+        assert address not in matcher
+
+
+@pytest.mark.asyncio
+async def test_ip_filter_reload(tmp_path) -> None:
+    """Test that the black list file is reloaded in the background when it changes"""
+    path = tmp_path / 'black_list.txt'
+    path.write_text('# banned\n10.0.0.0/8\nmalformed\n')
+    black_list = IPFilter(['172.19.0.0'], path=str(path), reload_interval=0.01)
+    assert '10.1.2.3' in black_list
+    assert '172.19.0.0' in black_list
+    await black_list.start()
+    try:
+        path.write_text('192.168.0.0/16\n')
+        os.utime(path, (0, 1))
+        for _ in range(100):
+            if '10.1.2.3' not in black_list:
+                break
+            await asyncio.sleep(0.01)
+        assert '10.1.2.3' not in black_list
+        assert '192.168.4.2' in black_list
+        path.unlink()
+        await asyncio.sleep(0.05)
+        assert '192.168.4.2' in black_list
+    finally:
+        await black_list.stop()
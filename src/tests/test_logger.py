@@ -0,0 +1,62 @@
+"""Logging tests"""
+import logging
+import sys
+
+import orjson
+import pytest
+
+from core.logger import JSONFormatter, LazyQueueHandler, SamplingFilter, set_logger, stop_listeners
+
+
+def make_record(**extra) -> logging.LogRecord:
+    """Returns a record logged by the tests"""
+    record = logging.LogRecord('tests', logging.INFO, __file__, 1, "Accessing %s", ('url',), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter() -> None:
+    """Test that records are formatted as JSON lines with the extra fields"""
+    entry = orjson.loads(JSONFormatter().format(make_record(client_host='127.0.0.1',
+                                                            sampled=True)))
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'tests'
+    assert entry['message'] == 'Accessing url'
+    assert entry['client_host'] == '127.0.0.1'
+    assert 'sampled' not in entry
+    try:
+        raise ValueError('failure')
+    except ValueError:
+        record = logging.LogRecord('tests', logging.ERROR, __file__, 1, 'Failed', None,
+                                   exc_info=sys.exc_info())
+    assert 'ValueError: failure' in orjson.loads(JSONFormatter().format(record))['exception']
+
+
+def test_sampling_filter() -> None:
+    """Test that only sampled records are dropped"""
+    assert not SamplingFilter(0).filter(make_record(sampled=True))
+    assert SamplingFilter(0).filter(make_record())
+    assert SamplingFilter(1).filter(make_record(sampled=True))
+    assert not SamplingFilter(0, sample_all=True).filter(make_record())
+    assert SamplingFilter(1, sample_all=True).filter(make_record())
+
+
+def test_queued_logging(capsys: pytest.CaptureFixture) -> None:
+    """Test that records are written by the background thread"""
+    try:
+        set_logger(log_format='json', sample_rate=0)
+        assert all(isinstance(handler, LazyQueueHandler)
+                   for handler in logging.getLogger().handlers)
+        logger = logging.getLogger('tests')
+        logger.info("Accessing %s", 'url', extra={'sampled': True})
+        logger.info("Created %s", 'url', extra={'short_url': 'http://localhost:8000/1'})
+        logging.getLogger('uvicorn.access').info('%s - "%s %s HTTP/%s" %d', '127.0.0.1:1234',
+                                                 'GET', '/1', '1.1', 307)
+        stop_listeners()
+        captured = capsys.readouterr()
+        assert [orjson.loads(line)['message']
+                for line in captured.err.splitlines()] == ['Created url']
+        assert 'GET' not in captured.out
+    finally:
+        with capsys.disabled():
+            set_logger()
@@ -0,0 +1,64 @@
+"""Metrics tests"""
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import orjson
+import pytest
+
+from core.metrics import Counter, Gauge, Histogram, MetricsRegistry, render
+
+
+def test_render() -> None:
+    """Test the Prometheus text format of the metrics"""
+    registry = MetricsRegistry()
+    counter = registry.register(Counter('lookups_total', 'Lookups', labels=('result',)))
+    histogram = registry.register(Histogram('duration_seconds', 'Duration', buckets=(0.1, 1)))
+    counter.inc(('hit',))
+    counter.inc(('hit',), amount=2)
+    counter.set_function(lambda: 5, ('miss',))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert render(registry.snapshot()).splitlines() == [
+        '# HELP lookups_total Lookups',
+        '# TYPE lookups_total counter',
+        'lookups_total{result="hit"} 3.0',
+        'lookups_total{result="miss"} 5.0',
+        '# HELP duration_seconds Duration',
+        '# TYPE duration_seconds histogram',
+        'duration_seconds_bucket{le="0.1"} 2',
+        'duration_seconds_bucket{le="1.0"} 3',
+        'duration_seconds_bucket{le="+Inf"} 4',
+        'duration_seconds_sum 3.65',
+        'duration_seconds_count 4',
+    ]
+    with pytest.raises(ValueError):
+        registry.register(Gauge('lookups_total', 'Lookups'))
+
+
+@pytest.mark.asyncio
+async def test_multiprocess_metrics(tmp_path: Path) -> None:
+    """Test that metrics of workers are merged and gauges of exited workers are skipped"""
+    registry = MetricsRegistry()
+    counter = registry.register(Counter('requests_total', 'Requests'))
+    gauge = registry.register(Gauge('in_progress', 'In progress'))
+    histogram = registry.register(Histogram('duration_seconds', 'Duration', buckets=(1,)))
+    counter.inc()
+    gauge.inc()
+    histogram.observe(0.5)
+    await registry.start(str(tmp_path), interval=60)
+    exited = [{**metric, 'samples': [[[], [0, 1, 2.0] if metric['kind'] == 'histogram' else 2]]}
+              for metric in registry.snapshot()]
+    # the parent process keeps running, unlike a child process which has been waited for
+    child = subprocess.Popen([sys.executable, '-c', ''])
+    child.wait()
+    exited_pid = child.pid
+    (tmp_path / f'metrics_{exited_pid}.json').write_bytes(orjson.dumps(exited))
+    (tmp_path / f'metrics_{os.getppid()}.json').write_bytes(orjson.dumps(exited))
+    samples = {metric['name']: metric['samples'] for metric in await registry.collect()}
+    assert samples['requests_total'] == [((), 5.0)]
+    assert samples['in_progress'] == [((), 3.0)]
+    assert samples['duration_seconds'] == [((), [1, 2, 4.5])]
+    await registry.stop()
+    assert (tmp_path / f'metrics_{os.getpid()}.json').exists()
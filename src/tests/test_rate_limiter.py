@@ -0,0 +1,49 @@
+"""Rate limiter tests"""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from services.cache import UnixSocketSharedCache
+from services.cache_server import CacheServer
+from services.rate_limiter import GCRATable, RateLimiter
+
+
+def test_gcra_table() -> None:
+    """Test that bursts are allowed and the sustained rate is enforced"""
+    table = GCRATable(max_size=2)
+    assert [table.acquire('a', interval=1, limit=3, now=0) for _ in range(4)] == [0, 0, 0, 1]
+    assert table.acquire('a', interval=1, limit=3, now=0.5) == 0.5
+    assert table.acquire('a', interval=1, limit=3, now=1) == 0
+    table.acquire('b', interval=1, limit=3, now=1)
+    table.acquire('c', interval=1, limit=3, now=1)
+    assert len(table) == 2
+    assert table.acquire('a', interval=1, limit=3, now=1) == 0
+    table.acquire('d', interval=1, limit=3, now=10)
+    assert len(table) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_rate_limiter(tmp_path: Path) -> None:
+    """Test that limits are shared through the cache server and kept locally without it"""
+    path = str(tmp_path / 'cache.sock')
+    server = await asyncio.start_unix_server(
+        CacheServer(max_size=10, ttl=60, negative_ttl=60).handle, path=path)
+    limiters = [RateLimiter(max_clients=10, shared=UnixSocketSharedCache(path))
+                for _ in range(2)]
+    try:
+        assert await limiters[0].acquire('create:host', rate=0.01, burst=1) == 0
+        assert await limiters[1].acquire('create:host', rate=0.01, burst=1) > 0
+    finally:
+        for limiter in limiters:
+            await limiter.close()
+        server.close()
+        await server.wait_closed()
+        # let the handlers see the closed connections before the loop goes away
+        await asyncio.sleep(0.01)
+    limiter = RateLimiter(max_clients=10, shared=UnixSocketSharedCache(str(tmp_path / 'no.sock')))
+    try:
+        assert await limiter.acquire('create:host', rate=0.01, burst=1) == 0
+        assert await limiter.acquire('create:host', rate=0.01, burst=1) > 0
+    finally:
+        await limiter.close()
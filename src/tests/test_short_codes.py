@@ -0,0 +1,75 @@
+"""Short code generation tests"""
+import pytest
+from sqlalchemy import Sequence, schema as sa_schema
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from services.block_allocator import BlockAllocator
+from core.config import app_settings
+from services.short_code_services import (MAX_CODE_KEY, HashShortURLProvider, build_short_url,
+                                          decode, encode, short_url_code_key, to_code_key)
+
+
+pytestmark = pytest.mark.asyncio
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+
+async def test_encode_decode() -> None:
+    """Test that encoding is fixed-width and reversible"""
+    for number in (0, 1, 61, 62, 3843, len(ALPHABET) ** 7 - 1):
+        code = encode(number, ALPHABET, 7)
+        assert len(code) == 7
+        assert decode(code, ALPHABET) == number
+    with pytest.raises(ValueError):
+        encode(len(ALPHABET) ** 7, ALPHABET, 7)
+    # decoding is not bounded by the BIGINT range of the lookup keys
+    for number in (MAX_CODE_KEY + 1, len(ALPHABET) ** 11 - 1):
+        assert decode(encode(number, ALPHABET, 11), ALPHABET) == number
+
+
+async def test_code_keys() -> None:
+    """Test that codes of the configured alphabet and length are decoded to lookup keys"""
+    alphabet, length = app_settings.short_code_alphabet, app_settings.short_code_length
+    code = encode(123456789, alphabet, length)
+    assert to_code_key(code) == decode(code, alphabet) == 123456789
+    assert short_url_code_key(build_short_url(code)) == 123456789
+    assert to_code_key(code[1:]) is None
+    assert to_code_key('-' * length) is None
+    assert short_url_code_key(f'https://tinyurl.com/{code}') is None
+
+
+async def test_code_keys_bound(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that codes decoded beyond the BIGINT range have no lookup key"""
+    monkeypatch.setattr(app_settings, 'short_code_length', 11)
+    alphabet = app_settings.short_code_alphabet
+    assert to_code_key(encode(MAX_CODE_KEY, alphabet, 11)) == MAX_CODE_KEY
+    assert to_code_key(encode(MAX_CODE_KEY + 1, alphabet, 11)) is None
+
+
+async def test_hash_provider() -> None:
+    """Test that the hash provider is deterministic and changes the code between attempts"""
+    provider = HashShortURLProvider(base_url='http://short.test/', alphabet=ALPHABET, length=7,
+                                    secret='secret')
+    first = await provider.shorten(None, 'https://example.com')
+    assert first == await provider.shorten(None, 'https://example.com')
+    assert first.startswith('http://short.test/')
+    assert len(first.rsplit('/', 1)[1]) == 7
+    assert first != await provider.shorten(None, 'https://example.com', attempt=1)
+
+
+async def test_block_allocator(setup_test_database: URL) -> None:
+    """Test that the allocator hands out unique numbers and reports unused ones"""
+    engine = create_async_engine(setup_test_database)
+    sequence = Sequence('test_blocks')
+    async with engine.begin() as connection:
+        await connection.execute(sa_schema.CreateSequence(sequence))
+    allocator = BlockAllocator(sequence=sequence, block_size=3, refill_threshold=0.5)
+    async with AsyncSession(engine) as session:
+        numbers = [await allocator.allocate(session) for _ in range(7)]
+    assert len(set(numbers)) == 7
+    assert numbers[:3] == [0, 1, 2]
+    leaked = await allocator.close()
+    assert sum(end - start for start, end in leaked) in (2, 5)
+    assert all(start not in numbers for start, _ in leaked)
+    await engine.dispose()
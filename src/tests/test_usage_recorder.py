@@ -0,0 +1,116 @@
+"""Usage recorder tests"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+import orjson
+import pytest
+
+from schemas.usage_schemas import UsageCreate
+from services import usage_recorder as usage_recorder_module
+from services.usage_recorder import UsageRecorder
+
+
+pytestmark = pytest.mark.asyncio
+
+USAGE = UsageCreate(url_id=1, client_host='127.0.0.1', client_port=50000)
+
+
+@asynccontextmanager
+async def session_factory() -> AsyncIterator[None]:
+    """Stands in for a database session, the rows are written by the patched repository"""
+    yield None
+
+
+async def test_failed_spill(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that usages which cannot be written or spilled are dropped without a hang"""
+    async def create_many(database: Any, rows: List[Dict[str, Any]]) -> None:
+        raise OSError('database is unavailable')
+
+    monkeypatch.setattr(usage_recorder_module.usage_crud, 'create_many', create_many)
+    recorder = UsageRecorder(max_queue_size=1, batch_size=10, flush_interval=0.01,
+                             overflow_policy='spill',
+                             spill_path=str(tmp_path / 'missing' / 'usages.ndjson'),
+                             stop_timeout=1)
+    await recorder.start(session_factory)
+    for _ in range(3):
+        assert await recorder.record(USAGE)
+    await asyncio.wait_for(recorder.stop(), 2)
+    assert recorder.dropped == 3
+    assert recorder.spilled == 0
+
+
+async def test_replay_partial_spill(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a partially written line of the spill file is skipped"""
+    written: List[Dict[str, Any]] = []
+
+    async def create_many(database: Any, rows: List[Dict[str, Any]]) -> None:
+        written.extend(rows)
+
+    monkeypatch.setattr(usage_recorder_module.usage_crud, 'create_many', create_many)
+    spill_path = tmp_path / 'usages.ndjson'
+    row = {**USAGE.model_dump(), 'usage_datetime': datetime(2024, 1, 1)}
+    spill_path.write_bytes(orjson.dumps(row) + b'\n' + orjson.dumps(row)[:10])
+    recorder = UsageRecorder(max_queue_size=10, batch_size=10, flush_interval=0.01,
+                             overflow_policy='spill', spill_path=str(spill_path))
+    await recorder.start(session_factory)
+    await recorder.stop()
+    assert written == [row]
+    assert recorder.dropped == 1
+    assert not spill_path.exists()
+
+
+async def test_spill_not_replayed_while_failing(tmp_path: Path,
+                                                monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the spill file is not replayed after failed writes"""
+    async def create_many(database: Any, rows: List[Dict[str, Any]]) -> None:
+        raise OSError('database is unavailable')
+
+    reads = []
+    original_read_lines = usage_recorder_module.read_lines
+
+    def read_lines(*args: Any) -> Any:
+        reads.append(args)
+        return original_read_lines(*args)
+
+    monkeypatch.setattr(usage_recorder_module.usage_crud, 'create_many', create_many)
+    monkeypatch.setattr(usage_recorder_module, 'read_lines', read_lines)
+    spill_path = tmp_path / 'usages.ndjson'
+    recorder = UsageRecorder(max_queue_size=10, batch_size=1, flush_interval=0.01,
+                             overflow_policy='spill', spill_path=str(spill_path))
+    await recorder.start(session_factory)
+    for _ in range(5):
+        assert await recorder.record(USAGE)
+        await asyncio.sleep(0.02)
+    assert not reads
+    await recorder.stop()
+    # the replay on stop fails at its first batch and keeps the spilled usages
+    assert len(reads) == 1
+    assert recorder.spilled == 5
+    assert len((tmp_path / 'usages.ndjson.replay').read_bytes().splitlines()) == 5
+
+
+async def test_resume_replay(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that a failed replay resumes after the last written batch"""
+    written: List[Dict[str, Any]] = []
+    failures = [False, True]
+
+    async def create_many(database: Any, rows: List[Dict[str, Any]]) -> None:
+        if failures and failures.pop(0):
+            raise OSError('database is unavailable')
+        written.extend(rows)
+
+    monkeypatch.setattr(usage_recorder_module.usage_crud, 'create_many', create_many)
+    spill_path = tmp_path / 'usages.ndjson'
+    rows = [{**USAGE.model_dump(), 'client_port': port, 'usage_datetime': datetime(2024, 1, 1)}
+            for port in range(5)]
+    spill_path.write_bytes(b''.join(orjson.dumps(row) + b'\n' for row in rows))
+    for _ in range(2):
+        recorder = UsageRecorder(max_queue_size=10, batch_size=2, flush_interval=0.01,
+                                 overflow_policy='spill', spill_path=str(spill_path))
+        await recorder.start(session_factory)
+        await recorder.stop()
+    assert written == rows
+    assert not list(tmp_path.iterdir())